@@ -12,14 +12,8 @@ from config import config
 from models.database import db, init_db
 from models.user import User, create_default_users
 from models.product import Product, create_sample_products
-from models.blockchain import load_blockchain, save_blockchain, get_blockchain_info
-
-# Import route blueprints
-from routes.auth import auth_bp
-from routes.dashboard import dashboard_bp
-from routes.products import products_bp
-from routes.analytics import analytics_bp
-from routes.blockchain import blockchain_bp  # NEW: Import blockchain routes
+from models.blockchain import load_blockchain, save_blockchain, get_blockchain_info, start_background_miner
+import models.rollup  # Registers the daily rollup tables before init_db creates tables
 
 
 def create_app(config_name='development'):
@@ -50,14 +44,25 @@ def create_app(config_name='development'):
         Load user for Flask-Login
         This function is called to reload the user object from the user ID stored in the session
         """
-        return User.query.get(int(user_id))
+        return User.load_for_request(int(user_id))
     
     # Register blueprints (route groups)
+    # Route modules are imported here, not at module top, so importing this
+    # module (or config/models) doesn't pull in every route's dependencies
+    from routes.auth import auth_bp
     app.register_blueprint(auth_bp, url_prefix='/auth')
+    
+    from routes.dashboard import dashboard_bp
     app.register_blueprint(dashboard_bp, url_prefix='/dashboard')
+    
+    from routes.products import products_bp
     app.register_blueprint(products_bp, url_prefix='/products')
+    
+    from routes.analytics import analytics_bp
     app.register_blueprint(analytics_bp, url_prefix='/analytics')
-    app.register_blueprint(blockchain_bp, url_prefix='/blockchain')  # NEW: Register blockchain routes
+    
+    from routes.blockchain import blockchain_bp
+    app.register_blueprint(blockchain_bp, url_prefix='/blockchain')
     
     # Main routes
     @app.route('/')
@@ -103,6 +108,9 @@ def create_app(config_name='development'):
             create_sample_products()
             print("🎯 Initial data created!")
     
+    # Mine new transactions off the request thread
+    start_background_miner(app)
+    
     return app
 
 # Create the app instance
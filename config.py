@@ -17,6 +17,25 @@ class Config:
     DATABASE_PATH = os.path.join(BASE_DIR, 'data', 'database.db')
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{DATABASE_PATH}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'query_cache_size': 1200,  # Compiled SQL statements kept in memory for reuse
+        # Request threads, the page query workers and the background miner
+        # each hold a connection, so keep more than the default 5 (+10) open
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_pre_ping': True,     # Replace connections that were closed under us
+        'pool_recycle': 1800,      # Seconds before a connection is reopened
+        'connect_args': {
+            'check_same_thread': False,  # Pooled connections move between threads
+            'timeout': 30                # Seconds to wait for another writer's lock
+        }
+    }
+    
+    # Cache configuration (used for analytics aggregates)
+    # Set CACHE_TYPE=RedisCache and CACHE_REDIS_URL to share the cache between workers
+    CACHE_TYPE = os.environ.get('CACHE_TYPE', 'SimpleCache')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    CACHE_DEFAULT_TIMEOUT = 60  # Seconds
     
     # Session configuration
     # How long users stay logged in
@@ -25,6 +44,8 @@ class Config:
     # Blockchain configuration
     BLOCKCHAIN_DIFFICULTY = 2  # How hard it is to mine a block (2 = easy for demo)
     BLOCKCHAIN_REWARD = 10     # Not used in our supply chain, but good to have
+    BACKGROUND_MINING = True   # Mine blocks in a background thread, not in the request
+    MINING_BATCH_WINDOW = 0.5  # Seconds the miner waits to gather more transactions per block
     
     # Application settings
     DEBUG = True               # Shows detailed errors (turn off in production)
@@ -46,7 +67,10 @@ class DevelopmentConfig(Config):
     Configuration for development (what we're using now)
     """
     DEBUG = True
-    SQLALCHEMY_ECHO = True     # Shows SQL queries in terminal (helpful for debugging)
+    # Show SQL queries in terminal (helpful for debugging)
+    # Off by default because logging every query slows down each request
+    # Turn on with: SQL_ECHO=1 python app.py
+    SQLALCHEMY_ECHO = os.environ.get('SQL_ECHO') == '1'
 
 
 class ProductionConfig(Config):
@@ -64,6 +88,11 @@ class TestingConfig(Config):
     """
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'  # Use memory database for tests
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'query_cache_size': 1200  # A memory database has a single connection, no pool settings
+    }
+    CACHE_TYPE = 'NullCache'  # Always run the real queries in tests
+    BACKGROUND_MINING = False  # Mine inside the request so tests see the block
 
 
 # Dictionary to easily switch between configurations
@@ -0,0 +1,101 @@
+"""
+Proof of Work nonce search
+Kept separate from the Block class so the hot loop works on local
+variables only and is only imported when a block is actually mined
+"""
+
+import hashlib
+import multiprocessing
+import os
+
+# Nonces tried between checks of the stop signal
+BATCH_SIZE = 4096
+
+# Difficulty from which mining is split across CPU cores
+# (below this a block is found faster than worker processes start)
+PARALLEL_DIFFICULTY = 3
+
+# Stop signal shared with the worker processes (set by _init_worker)
+_stop_event = None
+
+
+def find_nonce(prefix, difficulty, start=0, stride=1, stop_event=None):
+    """
+    Find the first nonce >= start whose hash meets the difficulty
+
+    Args:
+        prefix: Block bytes that come before the nonce (Block._prefix_bytes())
+        difficulty: Number of leading hex zeros required in hash
+        start: Nonce to start searching from
+        stride: Step between tried nonces (one stripe per worker)
+        stop_event: Optional event; the search gives up once it is set
+
+    Returns:
+        Tuple of (nonce, raw 32-byte digest), or None if stopped
+    """
+    # Leading hex zeros map to whole zero bytes plus, for odd
+    # difficulty, one zero high nibble in the next byte
+    zero_bytes = b"\x00" * (difficulty // 2)
+    half = difficulty // 2
+    odd = difficulty % 2 == 1
+
+    # Hash the fixed prefix once; each try only feeds the nonce
+    base = hashlib.sha256(prefix)
+    copy = base.copy
+
+    batch_start = start
+    while True:
+        batch_end = batch_start + BATCH_SIZE * stride
+        for nonce in range(batch_start, batch_end, stride):
+            ctx = copy()
+            ctx.update(str(nonce).encode())
+            digest = ctx.digest()
+            if digest.startswith(zero_bytes) and not (odd and digest[half] >> 4):
+                return nonce, digest
+
+        if stop_event is not None and stop_event.is_set():
+            return None
+        batch_start = batch_end
+
+
+def _init_worker(stop_event):
+    """
+    Store the shared stop signal in each worker process
+    """
+    global _stop_event
+    _stop_event = stop_event
+
+
+def _search_stripe(args):
+    """
+    Worker entry point: scan nonces start, start + stride, ...
+    """
+    prefix, difficulty, start, stride = args
+    return find_nonce(prefix, difficulty, start, stride, _stop_event)
+
+
+def find_nonce_parallel(prefix, difficulty, start=0, workers=None):
+    """
+    Search for a nonce on several CPU cores at once
+    Worker k tries nonces start + k, start + k + workers, ... and the
+    first worker to find a valid hash stops the others
+
+    Returns:
+        Tuple of (nonce, raw 32-byte digest)
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers < 2:
+        return find_nonce(prefix, difficulty, start)
+
+    try:
+        stop_event = multiprocessing.Event()
+        stripes = [(prefix, difficulty, start + k, workers) for k in range(workers)]
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(stop_event,)) as pool:
+            for result in pool.imap_unordered(_search_stripe, stripes):
+                if result is not None:
+                    stop_event.set()
+                    return result
+    except (OSError, RuntimeError) as e:
+        print(f"⚠️  Parallel mining unavailable ({e}), mining on one core")
+
+    return find_nonce(prefix, difficulty, start)
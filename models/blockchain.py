@@ -5,21 +5,44 @@ This handles the core blockchain functionality - blocks, chains, and mining
 
 import hashlib
 import json
+from collections import defaultdict
 from datetime import datetime
-from Crypto.Hash import SHA256
-from Crypto.PublicKey import RSA
-from Crypto.Signature import pkcs1_15
-import pickle
 import os
+import secrets
+import threading
+import time
+from flask import current_app
+from sqlalchemy import event
 from models.database import db
 
+try:
+    import orjson  # Optional C JSON encoder, much faster for large chains
+except ImportError:
+    orjson = None
+
+def _dumps_bytes(obj):
+    """
+    Serialize an object to compact JSON bytes (orjson when available)
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+# Transaction fields returned by the block detail API
+API_TX_FIELDS = ('transaction_id', 'transaction_type', 'product_id', 'from_user_id',
+                 'to_user_id', 'quantity', 'location', 'temperature', 'humidity')
+
 class Block:
     """
     Individual block in the blockchain
     Each block contains transactions and is linked to the previous block
     """
     
-    def __init__(self, index, transactions, previous_hash, nonce=0):
+    # Fixed attribute set, so each block in a long chain carries no __dict__
+    __slots__ = ('index', 'timestamp', 'transactions', 'previous_hash', 'nonce',
+                 'merkle_root', 'hash', '_tx_json', '_api_json')
+    
+    def __init__(self, index, transactions, previous_hash, nonce=0, timestamp=None):
         """
         Initialize a new block
         
@@ -28,24 +51,99 @@ class Block:
             transactions: List of transactions in this block
             previous_hash: Hash of the previous block
             nonce: Number used once (for proof of work)
+            timestamp: ISO timestamp of an existing block (new blocks use the current UTC time)
         """
         self.index = index
-        self.timestamp = datetime.utcnow().isoformat()
+        self.timestamp = timestamp if timestamp is not None else datetime.utcnow().isoformat()
         self.transactions = transactions  # List of transaction data
         self.previous_hash = previous_hash
         self.nonce = nonce
+        
+        # Serialized transaction list, only kept for legacy blocks whose
+        # header hashed it directly (see from_dict)
+        self._tx_json = None
+        tx_strings = [json.dumps(tx, sort_keys=True) for tx in transactions]
+        self.merkle_root = self._merkle_root_from(tx_strings)
         self.hash = self.calculate_hash()
+        self._api_json = None  # Block detail API body, built on first request
+    
+    @staticmethod
+    def _merkle_root_from(tx_strings):
+        """
+        Build a Merkle root from serialized transactions
+        Leaves are hashes of each transaction; pairs are hashed together
+        (duplicating the last one on odd levels) until one hash remains
+        """
+        level = [hashlib.sha256(tx.encode()).digest() for tx in tx_strings]
+        if not level:
+            return hashlib.sha256(b"").hexdigest()
+        
+        while len(level) > 1:
+            if len(level) % 2 == 1:
+                level.append(level[-1])
+            level = [hashlib.sha256(level[i] + level[i + 1]).digest()
+                     for i in range(0, len(level), 2)]
+        return level[0].hex()
+    
+    def calculate_merkle_root(self):
+        """
+        Calculate the Merkle root of the block's current transactions
+        """
+        return self._merkle_root_from([json.dumps(tx, sort_keys=True) for tx in self.transactions])
+    
+    def verify_transactions(self):
+        """
+        Check that the transactions still match what the block header committed to
+        """
+        if self.merkle_root is None:
+            # Legacy block, the header covered the full transaction list
+            return self._tx_json == json.dumps(self.transactions, sort_keys=True)
+        return self.merkle_root == self.calculate_merkle_root()
+    
+    def _prefix_bytes(self):
+        """
+        Serialize the block header except the nonce (it does not change while mining)
+        The header commits to the transactions through the Merkle root
+        """
+        if self.merkle_root is None:
+            # Blocks saved before Merkle roots were added hashed the full transaction list
+            body = self._tx_json
+        else:
+            body = self.merkle_root
+        return f"{self.index}{self.timestamp}{body}{self.previous_hash}".encode()
+    
+    @staticmethod
+    def _digest_with_nonce(prefix_ctx, nonce):
+        """
+        Finish a pre-fed SHA-256 context with the given nonce
+        Returns the raw 32-byte digest
+        
+        Args:
+            prefix_ctx: hashlib.sha256 object already fed with _prefix_bytes()
+            nonce: Nonce value to append
+        """
+        ctx = prefix_ctx.copy()
+        ctx.update(str(nonce).encode())
+        return ctx.digest()
     
     def calculate_hash(self):
         """
         Calculate SHA-256 hash of the block
         This creates a unique fingerprint for the block
         """
-        # Create string representation of block data
-        block_string = f"{self.index}{self.timestamp}{json.dumps(self.transactions, sort_keys=True)}{self.previous_hash}{self.nonce}"
-        
-        # Calculate SHA-256 hash
-        return hashlib.sha256(block_string.encode()).hexdigest()
+        return self._digest_with_nonce(hashlib.sha256(self._prefix_bytes()), self.nonce).hex()
+    
+    def has_valid_hash(self):
+        """
+        Check that the stored hash matches the block header
+        Hashes the header in one call and compares raw digests, so no
+        context copy or hex string is made per block
+        """
+        try:
+            stored = bytes.fromhex(self.hash)
+        except (TypeError, ValueError):
+            return False
+        return hashlib.sha256(self._prefix_bytes() + str(self.nonce).encode()).digest() == stored
     
     def mine_block(self, difficulty):
         """
@@ -55,14 +153,18 @@ class Block:
         Args:
             difficulty: Number of leading zeros required in hash
         """
-        target = "0" * difficulty  # e.g., "00" for difficulty 2
-        
         print(f"⛏️  Mining block {self.index}...")
         start_time = datetime.now()
         
-        while self.hash[:difficulty] != target:
-            self.nonce += 1
-            self.hash = self.calculate_hash()
+        # Imported here so the search loop is only loaded when mining
+        from models._pow import PARALLEL_DIFFICULTY, find_nonce, find_nonce_parallel
+        if difficulty >= PARALLEL_DIFFICULTY:
+            self.nonce, digest = find_nonce_parallel(self._prefix_bytes(), difficulty, self.nonce)
+        else:
+            self.nonce, digest = find_nonce(self._prefix_bytes(), difficulty, self.nonce)
+        
+        # Only hex-encode the winning digest
+        self.hash = digest.hex()
         
         end_time = datetime.now()
         time_taken = (end_time - start_time).total_seconds()
@@ -78,11 +180,53 @@ class Block:
             'index': self.index,
             'timestamp': self.timestamp,
             'transactions': self.transactions,
+            'merkle_root': self.merkle_root,
             'previous_hash': self.previous_hash,
             'nonce': self.nonce,
             'hash': self.hash
         }
     
+    def to_api_json(self):
+        """
+        JSON bytes for the block detail API
+        Blocks never change once they are on the chain, so the body is
+        serialized the first time it is asked for and reused after that
+        """
+        if self._api_json is None:
+            transactions = []
+            for tx in self.transactions:
+                tx_data = {field: tx.get(field) for field in API_TX_FIELDS}
+                tx_data['transaction_type'] = tx.get('transaction_type', 'unknown')
+                transactions.append(tx_data)
+
+            self._api_json = _dumps_bytes({
+                'index': self.index,
+                'hash': self.hash,
+                'previous_hash': self.previous_hash,
+                'timestamp': self.timestamp,
+                'nonce': self.nonce,
+                'transactions': transactions
+            })
+        return self._api_json
+    
+    @classmethod
+    def from_dict(cls, block_data):
+        """
+        Rebuild a block from its to_dict() form, keeping the stored hash
+        """
+        block = cls(
+            index=block_data['index'],
+            transactions=block_data['transactions'],
+            previous_hash=block_data['previous_hash'],
+            nonce=block_data['nonce'],
+            timestamp=block_data['timestamp']
+        )
+        block.merkle_root = block_data.get('merkle_root')
+        if block.merkle_root is None:
+            block._tx_json = json.dumps(block.transactions, sort_keys=True)
+        block.hash = block_data['hash']
+        return block
+    
     def __repr__(self):
         return f"<Block {self.index}: {self.hash[:10]}...>"
 
@@ -94,12 +238,23 @@ class Transaction(db.Model):
     """
     
     __tablename__ = 'transactions'
+    __table_args__ = (
+        # Per-product history lookups, ordered by block
+        db.Index('ix_tx_product_block', 'product_id', 'block_index'),
+        # Latest transaction per product
+        db.Index('ix_tx_product_ts', 'product_id', 'timestamp'),
+        # Analytics: recent transactions by type, time-ordered scans
+        db.Index('ix_txn_ts_type', 'timestamp', 'transaction_type'),
+        # Dashboard: a user's sent / received transactions, newest first
+        db.Index('ix_tx_from_ts', 'from_user_id', 'timestamp'),
+        db.Index('ix_tx_to_ts', 'to_user_id', 'timestamp'),
+    )
     
     # Primary key
     id = db.Column(db.Integer, primary_key=True)
     
     # Transaction identification
-    transaction_id = db.Column(db.String(100), unique=True, nullable=False)
+    transaction_id = db.Column(db.String(100), unique=True, nullable=False)  # UNIQUE also gives it an index
     block_index = db.Column(db.Integer)  # Which block contains this transaction
     
     # Product and ownership
@@ -160,10 +315,8 @@ class Transaction(db.Model):
         """
         Generate unique transaction ID
         """
-        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        hash_input = f"{self.product_id}{self.from_user_id}{self.to_user_id}{timestamp}"
-        hash_result = hashlib.sha256(hash_input.encode()).hexdigest()[:10]
-        return f"TX_{timestamp}_{hash_result}"
+        # Random suffix keeps IDs unique within the same second
+        return f"TX_{time.strftime('%Y%m%d%H%M%S')}_{secrets.token_hex(5)}"
     
     def to_blockchain_dict(self):
         """
@@ -193,6 +346,32 @@ class Transaction(db.Model):
         return f"<Transaction {self.transaction_id}>"
 
 
+# Number of leading hash characters used to bucket blocks for hash search
+HASH_PREFIX_LENGTH = 4
+
+def _block_date(timestamp):
+    """
+    Get the calendar date (YYYY-MM-DD) of a block timestamp
+    Returns None if the timestamp is missing or can't be parsed
+    """
+    if not timestamp:
+        return None
+    if not isinstance(timestamp, str):
+        return timestamp.date().isoformat()
+    # Block timestamps are written by isoformat(), so the date is simply
+    # the first ten characters; only unusual formats need parsing
+    if len(timestamp) >= 10 and timestamp[4] == '-' and timestamp[7] == '-' and timestamp[10:11] in ('', 'T', ' '):
+        return timestamp[:10]
+    try:
+        # Try parsing ISO format
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).date().isoformat()
+    except ValueError:
+        # Try other common formats
+        try:
+            return datetime.strptime(timestamp[:19], '%Y-%m-%d %H:%M:%S').date().isoformat()
+        except ValueError:
+            return None
+
 class FoodChainBlockchain:
     """
     Main blockchain class for food supply chain
@@ -211,6 +390,19 @@ class FoodChainBlockchain:
         self.pending_transactions = []
         self.mining_reward = 10  # Not used in supply chain, but good to have
         
+        # Lookup indexes, updated as blocks are added to the chain
+        self._product_index = defaultdict(list)  # product_id -> history entries
+        self._balance_index = defaultdict(int)   # user_id -> transaction count
+        self._tx_index = {}  # transaction_id -> (block_index, transaction)
+        self._hash_prefix_index = defaultdict(list)  # first hash characters -> block indexes
+        self._total_tx = 0  # Running count of transactions in the chain
+        self._reset_stats()
+        self._validated_height = 0  # Blocks below this index passed validate_chain()
+        self._verification_results = []  # Link checks for blocks 1.. (see get_verification_results)
+        
+        # Append-only journal file, set by load_from_journal()
+        self.journal_file = None
+        
         # Create genesis block (first block)
         self.create_genesis_block()
     
@@ -221,6 +413,7 @@ class FoodChainBlockchain:
         genesis_block = Block(0, [], "0")
         genesis_block.mine_block(self.difficulty)
         self.chain.append(genesis_block)
+        self._index_block(genesis_block)
         print("🎯 Genesis block created!")
     
     def get_latest_block(self):
@@ -253,9 +446,11 @@ class FoodChainBlockchain:
             return None
         
         # Create new block with pending transactions
+        # (requests may keep adding transactions while this block is mined)
+        transactions = self.pending_transactions.copy()
         block = Block(
             index=len(self.chain),
-            transactions=self.pending_transactions.copy(),
+            transactions=transactions,
             previous_hash=self.get_latest_block().hash
         )
         
@@ -264,12 +459,14 @@ class FoodChainBlockchain:
         
         # Add block to chain
         self.chain.append(block)
+        self._index_block(block)
+        self.append_block(block)
         
         # Update transaction records in database
         self.update_transaction_blocks(block)
         
-        # Clear pending transactions
-        self.pending_transactions = []
+        # Clear the mined transactions, keeping any that arrived meanwhile
+        del self.pending_transactions[:len(transactions)]
         
         print(f"✅ Block {block.index} added to blockchain!")
         return block
@@ -278,79 +475,247 @@ class FoodChainBlockchain:
         """
         Update database transactions with block information
         """
-        for transaction_data in block.transactions:
-            transaction_id = transaction_data.get('transaction_id')
-            if transaction_id:
-                transaction = Transaction.query.filter_by(transaction_id=transaction_id).first()
-                if transaction:
-                    transaction.block_index = block.index
-                    db.session.commit()
+        transaction_ids = [t['transaction_id'] for t in block.transactions if t.get('transaction_id')]
+        if not transaction_ids:
+            return
+        
+        # One bulk UPDATE and one commit for the whole block
+        Transaction.query.filter(Transaction.transaction_id.in_(transaction_ids)).update(
+            {'block_index': block.index}, synchronize_session=False
+        )
+        db.session.commit()
     
-    def validate_chain(self):
+    def validate_chain(self, check_transactions=False, full=False):
         """
         Validate the entire blockchain
         Check if all blocks are valid and properly linked
+        
+        Blocks already checked by an earlier call are skipped, so repeated
+        calls only hash the blocks added since then
+        
+        Args:
+            check_transactions: Also recompute each block's Merkle root
+                (the header hash alone only covers the stored root)
+            full: Re-check every block, ignoring earlier results
         """
-        for i in range(1, len(self.chain)):
+        start = 1
+        if not (full or check_transactions):
+            start = max(1, self._validated_height)
+        
+        for i in range(start, len(self.chain)):
             current_block = self.chain[i]
             previous_block = self.chain[i - 1]
             
             # Check if current block's hash is valid
-            if current_block.hash != current_block.calculate_hash():
+            if not current_block.has_valid_hash():
                 print(f"❌ Invalid hash at block {i}")
                 return False
             
+            # Check if transactions match the Merkle root
+            if check_transactions and not current_block.verify_transactions():
+                print(f"❌ Invalid Merkle root at block {i}")
+                return False
+            
             # Check if current block points to previous block
             if current_block.previous_hash != previous_block.hash:
                 print(f"❌ Invalid previous hash at block {i}")
                 return False
         
+        self._validated_height = len(self.chain)
         print("✅ Blockchain is valid!")
         return True
     
+    def get_verification_results(self):
+        """
+        Per-block link checks shown on the verification page
+        
+        The chain is append-only, so earlier results stay valid and only
+        blocks added since the last call are checked. If the last checked
+        block is no longer on the chain the checks start over
+        """
+        results = self._verification_results
+        if results:
+            last = results[-1]
+            if last['index'] >= len(self.chain) or self.chain[last['index']] is not last['block']:
+                results = self._verification_results = []
+        
+        for i in range(len(results) + 1, len(self.chain)):
+            block = self.chain[i]
+            block_valid = bool(block.hash)
+            prev_hash_valid = block.previous_hash == self.chain[i - 1].hash
+            results.append({
+                'index': i,
+                'block': block,
+                'is_valid': block_valid and prev_hash_valid,
+                'block_hash_valid': block_valid,
+                'prev_hash_valid': prev_hash_valid
+            })
+        return results
+    
+    def _index_block(self, block):
+        """
+        Add a block's transactions to the product and balance indexes
+        """
+        self._hash_prefix_index[block.hash[:HASH_PREFIX_LENGTH]].append(block.index)
+        
+        # Explorer statistics, so the stats page never walks the chain
+        block_size = len(_dumps_bytes(block.to_dict()))  # serialized size in bytes
+        self._block_sizes.append(block_size)
+        self._chain_size += block_size
+        block_date = _block_date(block.timestamp)
+        if block_date is not None:
+            self._daily_volumes[block_date] += len(block.transactions)
+        
+        for transaction in block.transactions:
+            self._tx_type_counts[transaction.get('transaction_type', 'unknown')] += 1
+            
+            transaction_id = transaction.get('transaction_id')
+            if transaction_id is not None:
+                self._tx_index[str(transaction_id)] = (block.index, transaction)
+            
+            product_id = transaction.get('product_id')
+            if product_id is not None:
+                self._product_index[product_id].append({
+                    'block_index': block.index,
+                    'block_hash': block.hash,
+                    'timestamp': block.timestamp,
+                    'transaction': transaction
+                })
+            
+            from_user_id = transaction.get('from_user_id')
+            if from_user_id is not None:
+                self._balance_index[from_user_id] -= 1
+            to_user_id = transaction.get('to_user_id')
+            if to_user_id is not None:
+                self._balance_index[to_user_id] += 1
+        
+        self._total_tx += len(block.transactions)
+    
+    def _rebuild_indexes(self):
+        """
+        Rebuild lookup indexes from the whole chain (used after loading)
+        """
+        self._product_index = defaultdict(list)
+        self._balance_index = defaultdict(int)
+        self._tx_index = {}
+        self._hash_prefix_index = defaultdict(list)
+        self._total_tx = 0
+        self._reset_stats()
+        self._validated_height = 0
+        self._verification_results = []
+        for block in self.chain:
+            self._index_block(block)
+    
+    def _reset_stats(self):
+        """
+        Clear the running explorer statistics (filled in by _index_block)
+        """
+        self._tx_type_counts = defaultdict(int)  # transaction_type -> count
+        self._daily_volumes = defaultdict(int)   # YYYY-MM-DD -> transaction count
+        self._block_sizes = []                   # serialized size of each block
+        self._chain_size = 0                     # sum of the block sizes
+    
+    def get_stats(self):
+        """
+        Get explorer statistics from the running counters
+        Returns a dict with 'stats', 'tx_types', 'daily_volumes' and 'block_sizes'
+        """
+        chain = self.chain
+        stats = {
+            'total_blocks': len(chain),
+            'total_transactions': self._total_tx,
+            'chain_size_bytes': self._chain_size,
+            'average_block_size': self._chain_size / len(chain) if chain else 0,
+            'mining_difficulty': self.difficulty,
+            'genesis_timestamp': chain[0].timestamp if chain else None,
+            'latest_timestamp': chain[-1].timestamp if chain else None
+        }
+        return {
+            'stats': stats,
+            'tx_types': dict(self._tx_type_counts),
+            'daily_volumes': dict(self._daily_volumes),
+            'block_sizes': list(self._block_sizes)
+        }
+    
     def get_balance(self, user_id):
         """
         Get transaction count for a user (not applicable for supply chain, but useful for analytics)
         """
-        balance = 0
-        for block in self.chain:
-            for transaction in block.transactions:
-                if transaction.get('from_user_id') == user_id:
-                    balance -= 1
-                if transaction.get('to_user_id') == user_id:
-                    balance += 1
-        return balance
+        return self._balance_index.get(user_id, 0)
+    
+    def find_transaction(self, transaction_id):
+        """
+        Find a mined transaction by its ID
+        Returns (block_index, transaction) or None if it isn't in the chain
+        """
+        return self._tx_index.get(str(transaction_id))
+    
+    def search_block_hashes(self, query):
+        """
+        Find blocks by hash (case-insensitive)
+        Queries of HASH_PREFIX_LENGTH or more characters match the start of
+        the hash and only look at one bucket of blocks; shorter queries
+        match anywhere in the hash
+        
+        Returns: List of block indexes in chain order
+        """
+        query = query.lower()
+        if len(query) < HASH_PREFIX_LENGTH:
+            return [i for i, block in enumerate(self.chain) if query in block.hash]
+        
+        bucket = self._hash_prefix_index.get(query[:HASH_PREFIX_LENGTH], [])
+        return [i for i in bucket if self.chain[i].hash.startswith(query)]
+    
+    def search_transactions(self, query):
+        """
+        Find mined transactions whose ID or product ID contains the query
+        Scans the ID indexes instead of walking every block
+        
+        Returns: List of (block_index, transaction) in chain order
+        """
+        # A full transaction ID is a dict hit (IDs all have the same
+        # length, so it can't be part of another one)
+        exact = self._tx_index.get(query)
+        if exact is not None:
+            return [exact]
+        
+        # Loop over snapshots: the background miner may index a new
+        # block while a request is searching
+        matches = {}
+        for transaction_id, entry in list(self._tx_index.items()):
+            if query in transaction_id:
+                matches[id(entry[1])] = entry
+        
+        for product_id, history in list(self._product_index.items()):
+            if query in str(product_id):
+                for entry in history:
+                    matches[id(entry['transaction'])] = (entry['block_index'], entry['transaction'])
+        
+        return sorted(matches.values(), key=lambda entry: entry[0])
     
     def get_product_history(self, product_id):
         """
         Get complete transaction history for a product
         """
-        history = []
-        for block in self.chain:
-            for transaction in block.transactions:
-                if transaction.get('product_id') == product_id:
-                    history.append({
-                        'block_index': block.index,
-                        'block_hash': block.hash,
-                        'timestamp': block.timestamp,
-                        'transaction': transaction
-                    })
-        return history
+        return list(self._product_index.get(product_id, []))
     
     def save_to_file(self, filename):
         """
         Save blockchain to file
         """
         try:
-            blockchain_data = {
-                'chain': [block.to_dict() for block in self.chain],
-                'difficulty': self.difficulty,
-                'pending_transactions': self.pending_transactions
-            }
-            
+            # Write one block at a time so only a single block dict
+            # is held in memory, not a copy of the whole chain
             filepath = os.path.join('data', filename)
-            with open(filepath, 'w') as f:
-                json.dump(blockchain_data, f, indent=2)
+            with open(filepath, 'wb') as f:
+                f.write(b'{"difficulty":%d,"pending_transactions":' % self.difficulty)
+                f.write(_dumps_bytes(self.pending_transactions))
+                f.write(b',"chain":[')
+                for i, block in enumerate(self.chain):
+                    if i:
+                        f.write(b',')
+                    f.write(_dumps_bytes(block.to_dict()))
+                f.write(b']}')
             
             print(f"💾 Blockchain saved to {filepath}")
         except Exception as e:
@@ -372,51 +737,143 @@ class FoodChainBlockchain:
             # Reconstruct chain
             self.chain = []
             for block_data in blockchain_data['chain']:
-                block = Block(
-                    index=block_data['index'],
-                    transactions=block_data['transactions'],
-                    previous_hash=block_data['previous_hash'],
-                    nonce=block_data['nonce']
-                )
-                block.timestamp = block_data['timestamp']
-                block.hash = block_data['hash']
-                self.chain.append(block)
+                self.chain.append(Block.from_dict(block_data))
             
             self.difficulty = blockchain_data.get('difficulty', 2)
             self.pending_transactions = blockchain_data.get('pending_transactions', [])
+            self._rebuild_indexes()
             
             print(f"📂 Blockchain loaded from {filepath}")
             print(f"📊 Chain length: {len(self.chain)} blocks")
             
         except Exception as e:
             print(f"❌ Error loading blockchain: {e}")
+            self.chain = []
+            self._rebuild_indexes()
             self.create_genesis_block()
     
-    def get_chain_info(self):
+    def append_block(self, block):
+        """
+        Append one block as a JSON line to the journal file
+        Each mined block is written once, so saving never rewrites the chain
+        """
+        if self.journal_file is None:
+            return
+        
+        try:
+            with open(self.journal_file, 'ab') as f:
+                f.write(_dumps_bytes(block.to_dict()) + b'\n')
+        except Exception as e:
+            print(f"❌ Error writing block {block.index} to journal: {e}")
+    
+    def load_from_journal(self, filename, snapshot_filename='blockchain.json'):
+        """
+        Load blockchain by replaying the append-only journal
+        New blocks mined afterwards are appended to the same file
+        
+        Args:
+            filename: Journal file in the data folder (one block per line)
+            snapshot_filename: Old full-chain JSON file, used to start the
+                journal if it does not exist yet
+        """
+        filepath = os.path.join('data', filename)
+        
+        if not os.path.exists(filepath):
+            # Start the journal from the old snapshot (or the fresh genesis block)
+            if os.path.exists(os.path.join('data', snapshot_filename)):
+                self.load_from_file(snapshot_filename)
+            self.journal_file = filepath
+            try:
+                with open(filepath, 'wb') as f:
+                    for block in self.chain:
+                        f.write(_dumps_bytes(block.to_dict()) + b'\n')
+                print(f"📝 Started blockchain journal at {filepath}")
+            except Exception as e:
+                print(f"❌ Error creating blockchain journal: {e}")
+            return
+        
+        try:
+            chain = []
+            with open(filepath, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        chain.append(Block.from_dict(json.loads(line)))
+            
+            if not chain:
+                raise ValueError("journal is empty")
+            
+            self.chain = chain
+            self._rebuild_indexes()
+            self.journal_file = filepath
+            
+            print(f"📂 Blockchain loaded from {filepath}")
+            print(f"📊 Chain length: {len(self.chain)} blocks")
+            
+        except Exception as e:
+            # Leave the damaged journal alone and keep the current chain in memory
+            print(f"❌ Error loading blockchain journal: {e}")
+    
+    def get_chain_info(self, validate=False):
         """
         Get blockchain statistics
+        
+        Args:
+            validate: Also run validate_chain() and include 'is_valid'
+                (rehashes every block, so only pages that show it ask for it)
         """
-        total_transactions = sum(len(block.transactions) for block in self.chain)
-        return {
+        info = {
             'total_blocks': len(self.chain),
-            'total_transactions': total_transactions,
+            'total_transactions': self._total_tx,
             'pending_transactions': len(self.pending_transactions),
             'difficulty': self.difficulty,
-            'latest_block_hash': self.get_latest_block().hash,
-            'is_valid': self.validate_chain()
+            'latest_block_hash': self.get_latest_block().hash
         }
+        if validate:
+            info['is_valid'] = self.validate_chain()
+        return info
     
     def __repr__(self):
         return f"<FoodChainBlockchain: {len(self.chain)} blocks>"
 
 
 # Global blockchain instance
-food_chain_blockchain = FoodChainBlockchain()
+# Created on first use so importing this module doesn't mine a genesis block
+food_chain_blockchain = None
+
+def get_blockchain():
+    """
+    Get the global blockchain instance, creating it on first use
+    """
+    global food_chain_blockchain
+    if food_chain_blockchain is None:
+        food_chain_blockchain = FoodChainBlockchain()
+    return food_chain_blockchain
+
+def _add_committed_transactions(session):
+    """
+    Put the transactions saved by add_product_transaction() on the
+    chain once their database rows are committed
+    """
+    for transaction_data in session.info.pop('chain_transactions', []):
+        get_blockchain().add_transaction(transaction_data)
+
+def _drop_uncommitted_transactions(session):
+    """
+    Forget queued chain transactions whose rows were rolled back
+    """
+    session.info.pop('chain_transactions', None)
+
+event.listen(db.session, 'after_commit', _add_committed_transactions)
+event.listen(db.session, 'after_rollback', _drop_uncommitted_transactions)
 
 # Helper functions for easy use
-def add_product_transaction(product_id, from_user_id, to_user_id, transaction_type, **kwargs):
+def add_product_transaction(product_id, from_user_id, to_user_id, transaction_type, commit=True, **kwargs):
     """
     Create and add a new product transaction to blockchain
+    
+    Pass commit=False to only flush the row, so the caller can commit it
+    together with its own changes; the transaction joins the blockchain's
+    pending pool when that commit succeeds
     """
     # Get quantity from kwargs, with default value
     quantity = kwargs.pop('quantity', 1.0)  # Remove quantity from kwargs to avoid duplicate
@@ -431,35 +888,114 @@ def add_product_transaction(product_id, from_user_id, to_user_id, transaction_ty
         **kwargs  # Now kwargs won't have 'quantity' in it
     )
     
-    # Save to database
+    # Save to database (flush fills in the id and defaults for the chain copy)
     db.session.add(transaction)
-    db.session.commit()
+    db.session.flush()
     
-    # Add to blockchain
-    food_chain_blockchain.add_transaction(transaction)
+    # Added to blockchain after the commit (see _add_committed_transactions)
+    db.session.info.setdefault('chain_transactions', []).append(transaction.to_blockchain_dict())
+    if commit:
+        db.session.commit()
     
     return transaction
 
+# Only one block is mined at a time
+_mine_lock = threading.Lock()
+
 def mine_new_block():
     """
     Mine all pending transactions into a new block
     """
-    return food_chain_blockchain.mine_pending_transactions()
+    with _mine_lock:
+        return get_blockchain().mine_pending_transactions()
+
+# Background miner: routes ask for a block with request_mining() and
+# return straight away; the app's miner thread waits a short batch window
+# so one block covers every transaction queued in the meantime
+
+def _run_miner(app, requested, batch_window):
+    """
+    Background miner loop: mine pending transactions whenever asked
+    """
+    while True:
+        requested.wait()
+        time.sleep(batch_window)  # Let more transactions join this block
+        requested.clear()
+        
+        with app.app_context():
+            try:
+                if get_blockchain().pending_transactions:
+                    mine_new_block()
+            except Exception as e:
+                db.session.rollback()
+                print(f"❌ Background mining failed: {e}")
 
-def get_blockchain_info():
+def start_background_miner(app):
+    """
+    Start the daemon thread that mines this app's queued transactions
+    Does nothing when BACKGROUND_MINING is off in the app config
+    """
+    if 'miner' in app.extensions or not app.config.get('BACKGROUND_MINING'):
+        return
+    
+    requested = threading.Event()
+    batch_window = app.config.get('MINING_BATCH_WINDOW', 0.5)
+    thread = threading.Thread(target=_run_miner, args=(app, requested, batch_window),
+                              name='miner', daemon=True)
+    app.extensions['miner'] = {'thread': thread, 'requested': requested}
+    thread.start()
+    print("⛏️  Background miner started")
+
+def request_mining():
+    """
+    Ask for the pending transactions to be mined into a block
+    The current app's background miner picks them up if BACKGROUND_MINING
+    is on; otherwise (tests, scripts) the block is mined right away and returned
+    """
+    miner = current_app.extensions.get('miner')
+    if miner is None or not current_app.config.get('BACKGROUND_MINING'):
+        return mine_new_block()
+    miner['requested'].set()
+    return None
+
+def get_chain_state():
+    """
+    Key that changes whenever the chain or its pending pool does:
+    (chain length, latest block hash, number of pending transactions)
+    """
+    blockchain = get_blockchain()
+    return (len(blockchain.chain), blockchain.get_latest_block().hash, len(blockchain.pending_transactions))
+
+# Last get_blockchain_info() result per validate flag, with the chain
+# state it was computed for
+_chain_info_cache = {}
+
+def get_blockchain_info(validate=False):
     """
     Get current blockchain information
+    Pass validate=True to include the 'is_valid' chain check
+    
+    The result is shared by every request until the chain changes: it is
+    keyed by the chain length, latest block hash and pending-pool size, so
+    adding a transaction or mining (or loading) a block makes the next call
+    recompute it. No expiry time is needed, and it is never stale
     """
-    return food_chain_blockchain.get_chain_info()
+    state = get_chain_state()
+    cached = _chain_info_cache.get(validate)
+    if cached is None or cached[0] != state:
+        cached = (state, get_blockchain().get_chain_info(validate=validate))
+        _chain_info_cache[validate] = cached
+    return cached[1]
 
 def save_blockchain():
     """
-    Save blockchain to file
+    Save a full snapshot of the blockchain to file
+    Mined blocks are already written to the journal as they are added
     """
-    food_chain_blockchain.save_to_file('blockchain.json')
+    get_blockchain().save_to_file('blockchain.json')
 
 def load_blockchain():
     """
-    Load blockchain from file
+    Load blockchain from the append-only journal
     """
-    food_chain_blockchain.load_from_file('blockchain.json')
\ No newline at end of file
+    get_blockchain().load_from_journal('blockchain.ndjson')
\ No newline at end of file
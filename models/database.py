@@ -3,7 +3,13 @@ Database setup and initialization
 This file handles all database connections and table creation
 """
 
+from flask import current_app
+from flask_caching import Cache
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, func, inspect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import object_session
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import os
 
@@ -11,14 +17,168 @@ import os
 # This will be used throughout our application
 db = SQLAlchemy()
 
+# Cache for expensive read-only queries (analytics aggregates)
+# Backend is chosen by CACHE_TYPE in config (in-process SimpleCache by default)
+cache = Cache()
+
+# Memoized functions whose results depend on table data, see cached_query()
+_cached_queries = []
+
+# Functions to call after a commit that changed table data, see after_data_commit()
+_commit_callbacks = []
+
+def cached_query(timeout=60):
+    """
+    Memoize a query helper and clear it whenever model data changes
+    """
+    def decorator(func):
+        memoized = cache.memoize(timeout=timeout)(func)
+        _cached_queries.append(memoized)
+        return memoized
+    return decorator
+
+@cached_query(timeout=300)
+def count_rows(model):
+    """
+    Number of rows in a model's table, for display-only totals
+    The result is kept until any row is written (see clear_cached_queries),
+    so repeated page loads don't recount large tables
+    """
+    return db.session.query(func.count()).select_from(model).scalar()
+
+def clear_cached_queries():
+    """
+    Drop all memoized query results (called once after a commit that wrote rows)
+    """
+    for memoized in _cached_queries:
+        cache.delete_memoized(memoized)
+
+def _on_row_written(mapper, connection, target):
+    """
+    Remember that a flush wrote rows, so the commit clears cached results
+    Clearing here would be too early (the data isn't committed yet) and
+    would run once for every row
+    """
+    session = object_session(target)
+    if session is not None:
+        session.info['data_changed'] = True
+
+def mark_data_changed():
+    """
+    Make the next commit clear cached results
+    For Core UPDATE/DELETE statements, which the ORM events don't see
+    """
+    db.session.info['data_changed'] = True
+
+def after_data_commit(func):
+    """
+    Register a function to call after a commit that changed table data
+    Used to recompute cached results in the background once they are cleared
+    """
+    _commit_callbacks.append(func)
+    return func
+
+def _run_commit_callbacks(session):
+    """
+    Clear cached results and call the after_data_commit() functions
+    if the commit changed data
+    """
+    if session.info.pop('data_changed', False):
+        clear_cached_queries()
+        for callback in _commit_callbacks:
+            callback()
+
+def _forget_data_changed(session):
+    """
+    Rolled back writes never reached the database, so nothing is stale
+    """
+    session.info.pop('data_changed', None)
+
+# Worker threads for running independent page queries at the same time
+query_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='queries')
+
+def run_in_app_context(app, func, args):
+    """
+    Run a query helper in a worker thread
+    Each thread gets its own app context, so its own database session
+    """
+    with app.app_context():
+        return func(*args)
+
+def run_queries_concurrently(jobs):
+    """
+    Run independent query helpers in parallel and collect their results
+    
+    Args:
+        jobs: Dict of name -> (function, args tuple)
+    
+    Returns:
+        Dict of name -> result
+    """
+    # An in-memory SQLite database is per connection, so threads would not see it
+    if db.engine.url.database in (None, '', ':memory:'):
+        return {name: func(*args) for name, (func, args) in jobs.items()}
+    
+    app = current_app._get_current_object()
+    futures = {
+        name: query_pool.submit(run_in_app_context, app, func, args)
+        for name, (func, args) in jobs.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Configure each new SQLite connection
+    WAL lets readers run while a write is in progress, and synchronous=NORMAL
+    only fsyncs at checkpoints instead of on every commit
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+# Indexes that older versions created and that are no longer declared
+_OBSOLETE_INDEXES = (
+    'ix_products_created_by_status',
+    'ix_products_creator_id',
+    'ix_products_owner_id',
+)
+
+def _existing_index_names(connection, table):
+    """
+    Names of the indexes a table already has in the database
+    SQLite's catalogue is read directly: reflecting indexes through the
+    inspector warns about (and skips) expression indexes like ix_product_day
+    """
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table.name,)
+        )
+        return {name for (name,) in rows}
+    return {index['name'] for index in inspect(connection).get_indexes(table.name)}
+
 def init_db(app):
     """
     Initialize database with Flask app
     This function connects our database to the Flask application
     """
     db.init_app(app)
+    cache.init_app(app)
+    
+    # Any insert/update/delete through the ORM makes cached results stale
+    # once it is committed
+    for event_name in ('after_insert', 'after_update', 'after_delete'):
+        if not event.contains(db.Model, event_name, _on_row_written):
+            event.listen(db.Model, event_name, _on_row_written, propagate=True)
+    if not event.contains(db.session, 'after_commit', _run_commit_callbacks):
+        event.listen(db.session, 'after_commit', _run_commit_callbacks)
+    if not event.contains(db.session, 'after_rollback', _forget_data_changed):
+        event.listen(db.session, 'after_rollback', _forget_data_changed)
     
     with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _set_sqlite_pragmas)
+        
         # Create data directory if it doesn't exist
         data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
         if not os.path.exists(data_dir):
@@ -26,6 +186,26 @@ def init_db(app):
         
         # Create all tables
         db.create_all()
+        
+        # create_all() skips tables that already exist, so also add any
+        # indexes declared after the table was first created
+        with db.engine.begin() as connection:
+            for table in db.metadata.sorted_tables:
+                existing = _existing_index_names(connection, table)
+                for index in table.indexes:
+                    if index.name in existing:
+                        continue
+                    try:
+                        index.create(connection)
+                    except OperationalError as e:
+                        # Only another process creating it first is expected
+                        if 'already exists' not in str(e.orig):
+                            raise
+                        print(f"ℹ️  Index {index.name} was created by another process")
+            
+            # Drop indexes that were replaced, so writes stop maintaining them
+            for name in _OBSOLETE_INDEXES:
+                connection.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
         print("✅ Database initialized successfully!")
 
 def reset_db(app):
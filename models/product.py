@@ -3,9 +3,38 @@ Product model for items in the supply chain
 Tracks products from creation to final destination
 """
 
-from models.database import db
-from datetime import datetime, timedelta
-import uuid
+from flask import current_app
+from sqlalchemy import Date, Integer, and_, bindparam, column, event, func, inspect, select, text, true, tuple_, update
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import deferred, selectinload, undefer_group
+from models.database import db, mark_data_changed
+from datetime import date, datetime, timedelta
+import json
+from operator import attrgetter
+import secrets
+
+try:
+    import orjson  # Optional C JSON encoder, serializes dates natively
+except ImportError:
+    orjson = None
+
+# Allowed values for the low-cardinality columns
+PRODUCT_CATEGORIES = ('vegetables', 'fruits', 'grains', 'dairy', 'meat', 'seafood', 'herbs', 'other')
+PRODUCT_STATUSES = ('created', 'in_transit', 'delivered', 'expired')
+
+# Column defaults filled in at INSERT time, so they also apply to bulk
+# inserts that never call Product.__init__
+def _default_batch_id(context):
+    return Product._gen_batch_id(context.get_current_parameters()['category'])
+
+def _default_owner_id(context):
+    # Products start out owned by their creator
+    return context.get_current_parameters()['created_by']
+
+def _default_expiry_date(context):
+    # Default to 30 days after harvest
+    harvest_date = context.get_current_parameters().get('harvest_date')
+    return harvest_date + timedelta(days=30) if harvest_date else None
 
 class Product(db.Model):
     """
@@ -14,17 +43,40 @@ class Product(db.Model):
     """
     
     __tablename__ = 'products'
+    __table_args__ = (
+        # Seeding looks products up by creator + name
+        db.Index('ix_products_creator_name', 'created_by', 'name'),
+        # Status filters are often combined with expiry checks
+        db.Index('ix_products_status_expiry', 'status', 'expiry_date'),
+        # Partial index over active products only (SQLite and PostgreSQL
+        # both support WHERE on an index; other databases get a plain index)
+        db.Index('ix_products_active', 'updated_at',
+                 sqlite_where=db.text("status IN ('created', 'in_transit')"),
+                 postgresql_where=db.text("status IN ('created', 'in_transit')")),
+        # Analytics: products by creation date + category, temperature ranges
+        db.Index('ix_product_created_cat', 'created_at', 'category'),
+        db.Index('ix_product_temp', 'temperature'),
+        # Dashboard stats and the search page's role + status/category
+        # filters, for creators and owners (covers all three columns)
+        db.Index('ix_products_creator_status', 'created_by', 'status', 'category'),
+        db.Index('ix_products_owner_status', 'current_owner_id', 'status', 'category'),
+        db.Index('ix_products_quality_score', 'quality_score'),
+        # The product list's keyset pages (by creator / owner, ordered by id)
+        # use the single-column created_by and current_owner_id indexes:
+        # every SQLite index entry ends with the rowid, so they are already
+        # sorted by id within each user
+    )
     
     # Primary key
     id = db.Column(db.Integer, primary_key=True)
     
     # Unique product identifier (like a serial number)
-    batch_id = db.Column(db.String(50), unique=True, nullable=False)
+    batch_id = db.Column(db.String(50), unique=True, nullable=False, default=_default_batch_id)
     
     # Product information
     name = db.Column(db.String(100), nullable=False)
-    category = db.Column(db.String(50), nullable=False)  # 'vegetables', 'fruits', 'grains', etc.
-    description = db.Column(db.Text)
+    category = db.Column(db.Enum(*PRODUCT_CATEGORIES, name='product_category'), nullable=False, index=True)
+    description = deferred(db.Column(db.Text), group='details')  # Loaded on first access (see undefer in routes)
     
     # Quantity and measurements
     quantity = db.Column(db.Float, nullable=False)  # Amount of product
@@ -37,11 +89,11 @@ class Product(db.Model):
     # Origin information
     origin_location = db.Column(db.String(200))  # Where product was produced
     harvest_date = db.Column(db.Date)
-    expiry_date = db.Column(db.Date)
+    expiry_date = db.Column(db.Date, default=_default_expiry_date)
     
     # Current status
     current_location = db.Column(db.String(200))
-    status = db.Column(db.String(50), default='created')  # 'created', 'in_transit', 'delivered', 'expired'
+    status = db.Column(db.Enum(*PRODUCT_STATUSES, name='product_status'), default='created', index=True)
     
     # Environmental conditions (current)
     temperature = db.Column(db.Float)  # Celsius
@@ -49,8 +101,9 @@ class Product(db.Model):
     pressure = db.Column(db.Float)     # For certain products
     
     # Ownership
-    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    current_owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    current_owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True,
+                                 default=_default_owner_id)
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -58,49 +111,63 @@ class Product(db.Model):
     
     # Relationships
     current_owner = db.relationship('User', foreign_keys=[current_owner_id], backref='owned_products')
-    transactions = db.relationship('Transaction', backref='product', lazy='dynamic', cascade='all, delete-orphan')
+    # Loaded for all products of a query with one extra IN query, newest first
+    # Products with thousands of transactions should use an explicit query instead
+    transactions = db.relationship('Transaction', backref='product', lazy='selectin',
+                                   order_by='Transaction.timestamp.desc()',
+                                   cascade='all, delete-orphan')
+
+    # Batch ID prefixes for the categories offered on the add product form
+    _CATEGORY_PREFIX = {
+        category: category[:3].upper()
+        for category in PRODUCT_CATEGORIES
+    }
 
     def __init__(self, name, category, quantity, unit, created_by, **kwargs):
         """
         Initialize new product
+        batch_id, current_owner_id and expiry_date are filled in by the
+        column defaults when the product is inserted
         """
         self.name = name
         self.category = category
         self.quantity = quantity
         self.unit = unit
         self.created_by = created_by
-        self.current_owner_id = created_by
-        
-        # Generate unique batch ID
-        self.batch_id = self.generate_batch_id()
         
         # Set optional fields
         for key, value in kwargs.items():
             if hasattr(self, key):
                 setattr(self, key, value)
-        
-        # Set default expiry date if not provided
-        if not self.expiry_date and self.harvest_date:
-            # Default to 30 days after harvest
-            self.expiry_date = self.harvest_date + timedelta(days=30)
 
-    def generate_batch_id(self):
+    @staticmethod
+    def _gen_batch_id(category):
         """
         Generate unique batch ID for product
-        Format: CATEGORY_TIMESTAMP_RANDOM
+        Format: CATEGORY_TIMESTAMP_RANDOM (timestamp is UTC, YYYYMMDDHHMM)
         """
-        timestamp = datetime.now().strftime('%Y%m%d%H%M')
-        random_part = str(uuid.uuid4())[:8].upper()
-        category_short = self.category[:3].upper()
+        now = datetime.utcnow()
+        timestamp = f"{now.year:04d}{now.month:02d}{now.day:02d}{now.hour:02d}{now.minute:02d}"
+        random_part = secrets.token_hex(4).upper()
+        category_short = Product._CATEGORY_PREFIX.get(category) or category[:3].upper()
         return f"{category_short}_{timestamp}_{random_part}"
 
+    @hybrid_property
     def is_expired(self):
         """
         Check if product has expired
+        Also works in queries: Product.query.filter(Product.is_expired)
         """
         if not self.expiry_date:
             return False
-        return datetime.now().date() > self.expiry_date
+        return date.today() > self.expiry_date
+
+    @is_expired.expression
+    def is_expired(cls):
+        # Compare against the app's local date, like the Python side does
+        # (the database's CURRENT_DATE is UTC); it is read on each execution
+        today = bindparam('today', callable_=date.today, type_=Date, unique=True)
+        return and_(cls.expiry_date.isnot(None), cls.expiry_date < today)
 
     def days_until_expiry(self):
         """
@@ -109,18 +176,62 @@ class Product(db.Model):
         """
         if not self.expiry_date:
             return None
-        delta = self.expiry_date - datetime.now().date()
+        delta = self.expiry_date - date.today()
         return delta.days
 
+    @hybrid_property
     def is_fresh(self):
         """
         Check if product is still fresh (not expired and good quality)
+        Also works in queries: Product.query.filter(Product.is_fresh)
         """
-        return not self.is_expired() and self.quality_score and self.quality_score >= 70
+        return not self.is_expired and self.quality_score is not None and self.quality_score >= 70
+
+    @is_fresh.expression
+    def is_fresh(cls):
+        return and_(~cls.is_expired, cls.quality_score >= 70)
+
+    @classmethod
+    def mark_expired(cls):
+        """
+        Set status to 'expired' on all expired products with one UPDATE
+        Does not commit - the caller commits once after all its changes
+        
+        Returns:
+            Number of products updated
+        """
+        result = db.session.execute(
+            update(cls)
+            .where(cls.is_expired, cls.status != 'expired')
+            .values(status='expired', updated_at=datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        # A Core UPDATE doesn't fire the ORM events that mark data as
+        # changed, so mark it here and the commit clears cached queries
+        mark_data_changed()
+        return result.rowcount
+
+    def _expiry_snapshot(self, today=None):
+        """
+        Work out expired / days until expiry / fresh in one go
+        Pass today when serializing many products so it is computed once
+        
+        Returns:
+            Tuple of (is_expired, days_until_expiry, is_fresh)
+        """
+        good_quality = self.quality_score is not None and self.quality_score >= 70
+        if not self.expiry_date:
+            return False, None, good_quality
+        
+        today = today or date.today()
+        days = (self.expiry_date - today).days
+        expired = days < 0
+        return expired, days, not expired and good_quality
 
     def update_environmental_conditions(self, temperature=None, humidity=None, pressure=None):
         """
         Update environmental conditions
+        Does not commit - the caller commits once after all its changes
         """
         if temperature is not None:
             self.temperature = temperature
@@ -130,11 +241,49 @@ class Product(db.Model):
             self.pressure = pressure
         
         self.updated_at = datetime.utcnow()
-        db.session.commit()
+
+    @classmethod
+    def bulk_update_env(cls, rows):
+        """
+        Update environmental conditions for many products in one executemany
+        Does not commit - the caller commits once after all its changes
+        
+        Args:
+            rows: List of dicts with 'id' and any of 'temperature',
+                'humidity', 'pressure' (missing or None keeps the old value)
+        """
+        if not rows:
+            return
+        
+        table = cls.__table__
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam('product_id'))
+            .values(
+                temperature=func.coalesce(bindparam('t'), table.c.temperature),
+                humidity=func.coalesce(bindparam('h'), table.c.humidity),
+                pressure=func.coalesce(bindparam('p'), table.c.pressure),
+                updated_at=bindparam('now')
+            )
+        )
+        now = datetime.utcnow()
+        db.session.execute(statement, [
+            {
+                'product_id': row['id'],
+                't': row.get('temperature'),
+                'h': row.get('humidity'),
+                'p': row.get('pressure'),
+                'now': now
+            }
+            for row in rows
+        ])
+        # Core statements skip the ORM events, see mark_expired()
+        mark_data_changed()
 
     def transfer_ownership(self, new_owner_id):
         """
         Transfer product ownership to new user
+        Does not commit - the caller commits once after all its changes
         """
         old_owner_id = self.current_owner_id
         self.current_owner_id = new_owner_id
@@ -144,21 +293,71 @@ class Product(db.Model):
         if self.status == 'created':
             self.status = 'in_transit'
         
-        db.session.commit()
         return old_owner_id
 
+    @classmethod
+    def get_by_batch_id(cls, batch_id):
+        """
+        Find a product by batch ID (None if not found)
+        """
+        return db.session.execute(_SELECT_PRODUCT_BY_BATCH, {'batch_id': batch_id}).scalar_one_or_none()
+
+    @classmethod
+    def search_condition(cls, search_text):
+        """
+        WHERE condition for products whose name, batch ID or description
+        match the search words
+        
+        On SQLite this looks the words up in the products_fts full-text
+        index (each word matches as a prefix); other databases fall back
+        to LIKE '%text%' scans
+        """
+        if db.engine.dialect.name != 'sqlite':
+            return (cls.name.contains(search_text) |
+                    cls.batch_id.contains(search_text) |
+                    cls.description.contains(search_text))
+        
+        # Quote every word so FTS5 operators in user input are matched literally
+        words = search_text.split()
+        if not words:
+            return true()
+        match = ' '.join('"%s"*' % word.replace('"', '""') for word in words)
+        return cls.id.in_(_SELECT_FTS_MATCH.bindparams(match=match))
+
+    @classmethod
+    def list_with_history(cls, ids):
+        """
+        Load several products with their transactions in two queries
+        (one for the products, one for all of their transactions)
+        """
+        loader = selectinload(cls.transactions)
+        if current_app.debug:
+            # Catch code that would fire extra queries per transaction
+            loader = loader.raiseload('*', sql_only=True)
+        return cls.query.options(loader).filter(cls.id.in_(ids)).all()
+
     def get_transaction_history(self):
         """
-        Get all transactions for this product
+        Get all transactions for this product (newest first)
+        The relationship is already loaded in that order
         """
-        from models.blockchain import Transaction  # Add this import
-        return self.transactions.order_by(Transaction.timestamp.desc()).all()
+        # Read-only: don't flush unrelated pending changes just to read
+        with db.session.no_autoflush:
+            return list(self.transactions)
 
     def get_current_location_info(self):
         """
         Get detailed current location information
         """
-        latest_transaction = self.transactions.order_by('Transaction.timestamp.desc()').first()
+        # Read-only: don't flush unrelated pending changes just to read
+        with db.session.no_autoflush:
+            if 'transactions' in inspect(self).unloaded:
+                # Not preloaded: fetch only the newest row (index seek on product_id, timestamp)
+                from models.blockchain import Transaction
+                latest_transaction = Transaction.query.filter_by(product_id=self.id)\
+                    .order_by(Transaction.timestamp.desc()).first()
+            else:
+                latest_transaction = self.transactions[0] if self.transactions else None
         if latest_transaction:
             return {
                 'location': latest_transaction.location,
@@ -170,42 +369,107 @@ class Product(db.Model):
             }
         return None
 
-    def to_dict(self):
+    # Fields holding date/datetime objects in _dict_fast()
+    _DATE_FIELDS = ('harvest_date', 'expiry_date', 'created_at', 'updated_at')
+
+    # Column fields copied by _dict_fast(), read with one C-level attrgetter call
+    _DICT_FIELDS = (
+        'id', 'batch_id', 'name', 'category', 'description', 'quantity', 'unit',
+        'quality_grade', 'quality_score', 'origin_location', 'current_location', 'status',
+        'temperature', 'humidity', 'pressure', 'harvest_date', 'expiry_date',
+        'created_by', 'current_owner_id', 'created_at', 'updated_at'
+    )
+    _get_dict_fields = attrgetter(*_DICT_FIELDS)
+
+    def _dict_fast(self, today=None):
+        """
+        Product fields as a dictionary, with dates left as date objects
+        """
+        data = dict(zip(self._DICT_FIELDS, self._get_dict_fields(self)))
+        data['is_expired'], data['days_until_expiry'], data['is_fresh'] = self._expiry_snapshot(today)
+        return data
+
+    def to_dict(self, today=None):
         """
         Convert product to dictionary
         """
-        return {
-            'id': self.id,
-            'batch_id': self.batch_id,
-            'name': self.name,
-            'category': self.category,
-            'description': self.description,
-            'quantity': self.quantity,
-            'unit': self.unit,
-            'quality_grade': self.quality_grade,
-            'quality_score': self.quality_score,
-            'origin_location': self.origin_location,
-            'current_location': self.current_location,
-            'status': self.status,
-            'temperature': self.temperature,
-            'humidity': self.humidity,
-            'pressure': self.pressure,
-            'harvest_date': self.harvest_date.isoformat() if self.harvest_date else None,
-            'expiry_date': self.expiry_date.isoformat() if self.expiry_date else None,
-            'is_expired': self.is_expired(),
-            'days_until_expiry': self.days_until_expiry(),
-            'is_fresh': self.is_fresh(),
-            'created_by': self.created_by,
-            'current_owner_id': self.current_owner_id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+        data = self._dict_fast(today)
+        for field in self._DATE_FIELDS:
+            value = data[field]
+            data[field] = value.isoformat() if value else None
+        return data
+
+    def to_json_bytes(self, today=None):
+        """
+        Serialize product straight to JSON bytes
+        orjson writes dates itself, so no isoformat() calls are needed; naive
+        datetimes come out exactly like to_dict()'s isoformat() strings
+        """
+        if orjson is not None:
+            return orjson.dumps(self._dict_fast(today))
+        return json.dumps(self.to_dict(today)).encode()
 
     def __repr__(self):
         """
         String representation of product
         """
-        return f'<Product {self.batch_id}: {self.name}>'
+        # Only plain columns, so printing products never triggers queries
+        return '<Product id=%s batch=%s>' % (self.id, self.batch_id)
+
+# Expression index for the per-day GROUP BY in the analytics quality trends
+db.Index('ix_product_day', func.date(Product.__table__.c.created_at))
+
+# Hot queries built once so SQLAlchemy's compiled statement cache is hit every time
+# (undefer_group needs no mapper lookup, so it is safe to build at import time)
+_SELECT_PRODUCT_BY_BATCH = select(Product).options(undefer_group('details'))\
+    .where(Product.batch_id == bindparam('batch_id'))
+_SELECT_FTS_MATCH = text('SELECT rowid FROM products_fts WHERE products_fts MATCH :match')\
+    .columns(column('rowid', Integer))
+
+# SQLite full-text index over the searchable product columns
+# External content table: the text stays in products, the triggers keep
+# the index in step with every insert, update and delete
+_SEARCH_INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+    "name, batch_id, description, content='products', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts(rowid, name, batch_id, description) "
+    "VALUES (new.id, new.name, new.batch_id, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, batch_id, description) "
+    "VALUES ('delete', old.id, old.name, old.batch_id, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, batch_id, description ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, batch_id, description) "
+    "VALUES ('delete', old.id, old.name, old.batch_id, old.description); "
+    "INSERT INTO products_fts(rowid, name, batch_id, description) "
+    "VALUES (new.id, new.name, new.batch_id, new.description); END",
+]
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_search_index(target, connection, **kw):
+    """
+    Create the full-text index and its triggers (SQLite only)
+    Runs on every create_all(), so existing databases get it too
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    
+    existed = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'products_fts'"
+    ).first() is not None
+    for statement in _SEARCH_INDEX_DDL:
+        connection.exec_driver_sql(statement)
+    if not existed:
+        # Index the products that were stored before the index existed
+        connection.exec_driver_sql("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_search_index(target, connection, **kw):
+    """
+    Drop the full-text index along with the products table
+    """
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql('DROP TABLE IF EXISTS products_fts')
 
 # Helper function to create sample products
 def create_sample_products():
@@ -214,9 +478,9 @@ def create_sample_products():
     """
     from models.user import User
     
-    # Get farmer user
-    farmer = User.query.filter_by(role='farmer').first()
-    if not farmer:
+    # Get farmer user (only the id is needed)
+    farmer_id = db.session.query(User.id).filter_by(role='farmer').limit(1).scalar()
+    if farmer_id is None:
         print("❌ No farmer found. Create users first!")
         return
     
@@ -233,8 +497,8 @@ def create_sample_products():
             'current_location': 'Farm Storage',
             'temperature': 18.5,
             'humidity': 65.0,
-            'harvest_date': datetime.now().date(),
-            'created_by': farmer.id
+            'harvest_date': date.today(),
+            'created_by': farmer_id
         },
         {
             'name': 'Fresh Apples',
@@ -248,18 +512,23 @@ def create_sample_products():
             'current_location': 'Farm Storage',
             'temperature': 15.0,
             'humidity': 70.0,
-            'harvest_date': datetime.now().date(),
-            'created_by': farmer.id
+            'harvest_date': date.today(),
+            'created_by': farmer_id
         }
     ]
     
-    for product_data in sample_products:
-        # Check if product already exists
-        existing_product = Product.query.filter_by(name=product_data['name'], 
-                                                 created_by=product_data['created_by']).first()
-        if not existing_product:
-            product = Product(**product_data)
-            db.session.add(product)
+    # Check which products already exist with one query
+    wanted = {(p['created_by'], p['name']): p for p in sample_products}
+    existing = {
+        (row.created_by, row.name) for row in
+        db.session.query(Product.created_by, Product.name)
+        .filter(tuple_(Product.created_by, Product.name).in_(list(wanted.keys())))
+        .all()
+    }
     
+    missing = [product_data for key, product_data in wanted.items() if key not in existing]
+    if missing:
+        # One executemany INSERT; the column defaults fill in batch_id etc.
+        db.session.execute(Product.__table__.insert(), missing)
     db.session.commit()
     print("✅ Sample products created!")
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""
+Daily rollup tables for the analytics time-series charts
+SQLite has no materialized views, so the per-day aggregates are kept in
+small tables and topped up from the raw rows when the charts ask for them
+"""
+
+from sqlalchemy import delete, func, insert, select, type_coerce
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+import threading
+from models.database import db
+from models.product import Product
+from models.blockchain import Transaction
+
+# Only one thread tops up the rollups at a time
+_refresh_lock = threading.Lock()
+
+class DailyProductQuality(db.Model):
+    """
+    Average quality score of the products created on each day
+    """
+
+    __tablename__ = 'daily_product_quality'
+
+    day = db.Column(db.String(10), primary_key=True)  # YYYY-MM-DD
+    avg_quality = db.Column(db.Float, nullable=False)
+    product_count = db.Column(db.Integer, nullable=False)
+
+class DailyTransactionVolume(db.Model):
+    """
+    Number of transactions recorded on each day
+    """
+
+    __tablename__ = 'daily_transaction_volume'
+
+    day = db.Column(db.String(10), primary_key=True)  # YYYY-MM-DD
+    transaction_count = db.Column(db.Integer, nullable=False)
+
+def _refresh_rollup(rollup, timestamp_column, aggregates, *filters):
+    """
+    Recompute the rollup rows from the newest stored day onwards
+
+    Products and transactions are only ever added, so days before the
+    newest stored one can't change; only that day (which may have been
+    partial) and later days are re-aggregated from the raw rows
+    """
+    last_day = db.session.query(func.max(rollup.day)).scalar()
+
+    day = func.date(timestamp_column)
+    source = select(day, *aggregates).where(*filters).group_by(day)
+    if last_day:
+        # Range filter on the raw column so its index can be used
+        source = source.where(timestamp_column >= datetime.strptime(last_day, '%Y-%m-%d'))
+        db.session.execute(delete(rollup).where(rollup.day >= last_day))
+
+    columns = [column.name for column in rollup.__table__.columns]
+    db.session.execute(insert(rollup).from_select(columns, source))
+
+def refresh_daily_rollups():
+    """
+    Bring both daily rollup tables up to date
+    """
+    with _refresh_lock:
+        try:
+            _refresh_rollup(
+                DailyProductQuality, Product.created_at,
+                [type_coerce(func.round(func.avg(Product.quality_score), 1), db.Float), func.count(Product.id)],
+                Product.quality_score.isnot(None), Product.quality_score > 0
+            )
+            _refresh_rollup(
+                DailyTransactionVolume, Transaction.timestamp,
+                [func.count(Transaction.id)]
+            )
+            db.session.commit()
+        except IntegrityError:
+            # Another process refreshed the same days first
+            db.session.rollback()
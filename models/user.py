@@ -4,11 +4,31 @@ Handles farmers, distributors, retailers, and inspectors
 """
 
 from flask_sqlalchemy import SQLAlchemy
+from flask import g
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import deferred
 from datetime import datetime
+import os
 from models.database import db
 
+# scrypt runs in OpenSSL's C code, faster per login than the default PBKDF2
+PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+
+# Stakeholder roles in the supply chain
+USER_ROLES = ('farmer', 'distributor', 'retailer', 'inspector')
+
+def hash_password(password):
+    """
+    Hash a password with the app's password hashing method
+    """
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+# Hash checked when a login names an unknown user, so that failed lookups
+# take as long as wrong passwords (created on first use)
+_dummy_password_hash = None
+
 class User(UserMixin, db.Model):
     """
     User model for all stakeholders in the supply chain
@@ -25,15 +45,15 @@ class User(UserMixin, db.Model):
     # Basic user information
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(200), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     
     # User profile
     full_name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20))
-    address = db.Column(db.Text)
+    address = deferred(db.Column(db.Text))  # Only shown on the profile pages
     
     # User role in supply chain
-    role = db.Column(db.String(20), nullable=False)  # 'farmer', 'distributor', 'retailer', 'inspector'
+    role = db.Column(db.Enum(*USER_ROLES, name='user_role'), nullable=False, index=True)
     
     # Business information
     company_name = db.Column(db.String(100))
@@ -60,14 +80,26 @@ class User(UserMixin, db.Model):
     received_transactions = db.relationship('Transaction', foreign_keys='Transaction.to_user_id', 
                                           backref='receiver', lazy='dynamic')
 
+    # Role lookup tables, shared by all users
+    _ROLE_DISPLAY = {
+        'farmer': 'Farmer/Producer',
+        'distributor': 'Distributor',
+        'retailer': 'Retailer',
+        'inspector': 'Inspector'
+    }
+    _TRANSFER_ROLES = frozenset({'farmer', 'distributor'})
+    _RECEIVE_ROLES = frozenset({'distributor', 'retailer'})
+
     def __init__(self, username, email, password, full_name, role, **kwargs):
         """
         Initialize new user
         **kwargs allows additional parameters like company_name, phone, etc.
+        Pass password=None with password_hash=... to use an already hashed password
         """
         self.username = username
         self.email = email
-        self.set_password(password)
+        if password is not None:
+            self.set_password(password)
         self.full_name = full_name
         self.role = role
         
@@ -81,7 +113,7 @@ class User(UserMixin, db.Model):
         Hash and store password securely
         We never store plain text passwords!
         """
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         """
@@ -94,13 +126,14 @@ class User(UserMixin, db.Model):
         """
         Get user-friendly role name
         """
-        role_names = {
-            'farmer': 'Farmer/Producer',
-            'distributor': 'Distributor',
-            'retailer': 'Retailer',
-            'inspector': 'Inspector'
-        }
-        return role_names.get(self.role, self.role.title())
+        return self.role_display(self.role)
+
+    @classmethod
+    def role_display(cls, role):
+        """
+        User-friendly name for a role value
+        """
+        return cls._ROLE_DISPLAY.get(role, role.title())
 
     def can_create_products(self):
         """
@@ -114,20 +147,63 @@ class User(UserMixin, db.Model):
         Check if user can transfer products
         Farmers and distributors can transfer
         """
-        return self.role in ['farmer', 'distributor']
+        return self.role in self._TRANSFER_ROLES
 
     def can_receive_products(self):
         """
         Check if user can receive products
         Distributors and retailers can receive
         """
-        return self.role in ['distributor', 'retailer']
+        return self.role in self._RECEIVE_ROLES
+
+    @classmethod
+    def get_by_username(cls, username):
+        """
+        Find a user by username (None if not found)
+        """
+        return db.session.execute(_SELECT_USER_BY_USERNAME, {'username': username}).scalar_one_or_none()
+
+    @classmethod
+    def authenticate(cls, username, password):
+        """
+        Find a user by username and check their password
+        Returns the user, or None if the username or password is wrong
+        
+        Unknown usernames still pay for one password hash check, so the
+        response time doesn't reveal which usernames exist
+        """
+        global _dummy_password_hash
+        user = cls.get_by_username(username)
+        if user is None:
+            if _dummy_password_hash is None:
+                _dummy_password_hash = hash_password(os.urandom(16).hex())
+            check_password_hash(_dummy_password_hash, password)
+            return None
+        return user if user.check_password(password) else None
+
+    @classmethod
+    def load_for_request(cls, user_id):
+        """
+        Load a user by ID for Flask-Login
+        
+        Only kept on g for the rest of the request (never in the shared
+        cache), so deactivating a user or changing their role takes
+        effect on their very next request, in every worker
+        """
+        users = g.setdefault('_loaded_users', {})
+        if user_id not in users:
+            users[user_id] = db.session.get(cls, user_id)
+        return users[user_id]
 
     def update_last_login(self):
         """
         Update last login timestamp
+        A single UPDATE statement: no ORM flush, so the analytics query
+        cache isn't cleared on every login
         """
-        self.last_login = datetime.utcnow()
+        db.session.execute(
+            update(User).where(User.id == self.id).values(last_login=datetime.utcnow())
+        )
         db.session.commit()
 
     def to_dict(self):
@@ -153,7 +229,11 @@ class User(UserMixin, db.Model):
         """
         String representation of user (for debugging)
         """
-        return f'<User {self.username} ({self.role})>'
+        # Only plain columns, so printing users never triggers queries
+        return '<User id=%s %s>' % (self.id, self.username)
+
+# Hot queries built once so SQLAlchemy's compiled statement cache is hit every time
+_SELECT_USER_BY_USERNAME = select(User).where(User.username == bindparam('username'))
 
 # Helper function to create default users
 def create_default_users():
@@ -190,13 +270,21 @@ def create_default_users():
         }
     ]
     
-    for user_data in default_users:
-        # Check if user already exists
-        existing_user = User.query.filter_by(username=user_data['username']).first()
-        if not existing_user:
-            user = User(**user_data)
-            user.is_verified = True  # Auto-verify default users
-            db.session.add(user)
+    # Check which users already exist with one query
+    usernames = [user_data['username'] for user_data in default_users]
+    existing = {
+        row.username for row in
+        db.session.query(User.username).filter(User.username.in_(usernames)).all()
+    }
+    
+    missing = [user_data for user_data in default_users if user_data['username'] not in existing]
+    
+    new_users = []
+    for user_data in missing:
+        user = User(**user_data)  # Hashes the password
+        user.is_verified = True  # Auto-verify default users
+        new_users.append(user)
     
+    db.session.add_all(new_users)
     db.session.commit()
     print("✅ Default users created!")
\ No newline at end of file
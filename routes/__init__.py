@@ -0,0 +1,24 @@
+"""
+Helpers shared by the route blueprints
+"""
+
+from flask import Response, jsonify
+
+try:
+    import orjson  # Optional C JSON encoder for the polled APIs
+except ImportError:
+    orjson = None
+
+def json_response(data):
+    """
+    Build a JSON response, serialized with orjson when it is installed
+    Falls back to jsonify() without orjson or for types it can't encode
+    Naive datetimes are written like isoformat(), with no UTC suffix, to
+    match the strings the models' to_dict() methods return
+    """
+    if orjson is not None:
+        try:
+            return Response(orjson.dumps(data), mimetype='application/json')
+        except TypeError:
+            pass
+    return jsonify(data)
@@ -4,13 +4,28 @@ Authentication routes for user login, registration, and logout
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import check_password_hash
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
 from models.database import db
-from models.user import User
+from models.user import User, USER_ROLES
 
 # Create blueprint for authentication routes
 auth_bp = Blueprint('auth', __name__)
 
+def _duplicate_errors(username, email):
+    """
+    Error messages for a username or email that is already taken
+    One query checks both columns
+    """
+    taken = db.session.query(User.username, User.email)\
+        .filter(or_(User.username == username, User.email == email)).all()
+    errors = []
+    if any(row.username == username for row in taken):
+        errors.append('Username already exists.')
+    if any(row.email == email for row in taken):
+        errors.append('Email already registered.')
+    return errors
+
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     """
@@ -31,14 +46,15 @@ def login():
             flash('Please enter both username and password.', 'danger')
             return render_template('auth/login.html')
         
-        # Find user
-        user = User.query.filter_by(username=username).first()
+        # Find user and check password
+        user = User.authenticate(username, password)
         
-        if user and user.check_password(password):
+        if user:
             if user.is_active:
                 login_user(user, remember=remember)
-                user.update_last_login()
+                # Flash before committing, the commit expires the loaded user
                 flash(f'Welcome back, {user.full_name}!', 'success')
+                user.update_last_login()
                 
                 # Redirect to next page or dashboard
                 next_page = request.args.get('next')
@@ -90,15 +106,11 @@ def register():
         if not full_name:
             errors.append('Full name is required.')
         
-        if not role or role not in ['farmer', 'distributor', 'retailer', 'inspector']:
+        if not role or role not in USER_ROLES:
             errors.append('Please select a valid role.')
         
         # Check if username or email already exists
-        if User.query.filter_by(username=username).first():
-            errors.append('Username already exists.')
-        
-        if User.query.filter_by(email=email).first():
-            errors.append('Email already registered.')
+        errors.extend(_duplicate_errors(username, email))
         
         if errors:
             for error in errors:
@@ -124,6 +136,17 @@ def register():
             flash('Registration successful! Please log in.', 'success')
             return redirect(url_for('auth.login'))
             
+        except IntegrityError as e:
+            db.session.rollback()
+            # Someone took the username or email since the check above:
+            # look again to report which one, like the other field errors
+            errors = _duplicate_errors(username, email)
+            if not errors:
+                errors = ['Registration failed. Please try again.']
+                print(f"Registration error: {e}")
+            for error in errors:
+                flash(error, 'danger')
+            
         except Exception as e:
             db.session.rollback()
             flash('Registration failed. Please try again.', 'danger')
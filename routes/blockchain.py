@@ -2,36 +2,83 @@
 Blockchain explorer routes for viewing blockchain data
 """
 
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, make_response, session, Response
 from flask_login import login_required, current_user
-from models.blockchain import food_chain_blockchain, get_blockchain_info
+from sqlalchemy.orm import load_only
+from models.blockchain import get_blockchain, get_blockchain_info, get_chain_state, _dumps_bytes
 from models.product import Product
 from models.user import User
 from models.blockchain import Transaction
 from models.database import db
 import json
+import hashlib
+import re
+
+# A pasted full block hash (64 hex characters)
+_FULL_HASH_RE = re.compile(r'[0-9a-fA-F]{64}')
 
 # Create blueprint for blockchain routes
 blockchain_bp = Blueprint('blockchain', __name__)
 
+def _page_etag(*parts):
+    """
+    Build an ETag for a rendered page from the data it shows
+    The shared layout shows the user's name and role, so those are always
+    part of the key (a profile edit or role change gives a new ETag)
+    """
+    key = repr(parts + (current_user.id, current_user.full_name, current_user.role))
+    return hashlib.md5(key.encode()).hexdigest()
+
+def _not_modified(etag):
+    """
+    Return a 304 response if the client already has this version of the page
+    (never while flashed messages are waiting, they must be rendered)
+    """
+    if etag in request.if_none_match and not session.get('_flashes'):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        return response
+    return None
+
+def _with_etag(body, etag):
+    """
+    Turn a rendered page into a response carrying its ETag
+    Pages show the logged-in user, so only the browser may cache them
+    """
+    response = make_response(body)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
 @blockchain_bp.route('/')
 @login_required
 def explorer():
     """
     Main blockchain explorer page
     """
+    blockchain = get_blockchain()
     page = request.args.get('page', 1, type=int)
     per_page = 10
     
-    # Get blockchain info
-    blockchain_info = get_blockchain_info()
-    
     # Get total blocks
-    total_blocks = len(food_chain_blockchain.chain)
+    total_blocks = len(blockchain.chain)
+    
+    # The page changes when a block is mined or a transaction is queued
+    # (it shows the total and pending transaction counts)
+    length, latest_hash, pending = get_chain_state()
+    etag = _page_etag('explorer', length, latest_hash, pending, page)
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
+    
+    # Get blockchain info (the explorer shows the validity badge)
+    blockchain_info = get_blockchain_info(validate=True)
     
     if total_blocks == 0:
         return render_template('blockchain/explorer.html',
                              blocks=[],
+                             has_blocks=False,
                              blockchain_info=blockchain_info,
                              page=page,
                              per_page=per_page,
@@ -41,26 +88,26 @@ def explorer():
     
     # Calculate pagination indices (reverse order - newest first)
     start_index = max(0, total_blocks - (page * per_page))
-    end_index = min(total_blocks, total_blocks - ((page - 1) * per_page))
+    end_index = max(0, total_blocks - ((page - 1) * per_page))
     
-    # Get blocks in reverse order (newest first)
-    blocks = []
-    for i in range(end_index - 1, start_index - 1, -1):
-        if i >= 0 and i < len(food_chain_blockchain.chain):
-            blocks.append(food_chain_blockchain.chain[i])
+    # Blocks in reverse order (newest first); the slice clamps pages past
+    # either end of the chain (e.g. ?page=0) to an empty page
+    page_blocks = blockchain.chain[start_index:end_index]
+    blocks = reversed(page_blocks)
     
     # Calculate pagination
     has_prev = page > 1
     has_next = start_index > 0
     
-    return render_template('blockchain/explorer.html',
+    return _with_etag(render_template('blockchain/explorer.html',
                          blocks=blocks,
+                         has_blocks=bool(page_blocks),
                          blockchain_info=blockchain_info,
                          page=page,
                          per_page=per_page,
                          has_prev=has_prev,
                          has_next=has_next,
-                         total_blocks=total_blocks)
+                         total_blocks=total_blocks), etag)
 
 @blockchain_bp.route('/block/<int:index>')
 @login_required
@@ -68,39 +115,50 @@ def view_block(index):
     """
     View detailed information about a specific block
     """
-    if index >= len(food_chain_blockchain.chain) or index < 0:
+    blockchain = get_blockchain()
+    if index >= len(blockchain.chain) or index < 0:
         flash('Block not found', 'danger')
         return redirect(url_for('blockchain.explorer'))
     
-    block = food_chain_blockchain.chain[index]
+    block = blockchain.chain[index]
+    
+    # Collect the related product and user IDs first, then load them with
+    # one IN query each instead of up to three lookups per transaction
+    # (chain transactions are plain dicts, see FoodChainBlockchain.add_transaction)
+    transactions = block.transactions
+    product_ids = {tx.get('product_id') for tx in transactions} - {None}
+    user_ids = ({tx.get('from_user_id') for tx in transactions} |
+                {tx.get('to_user_id') for tx in transactions}) - {None}
+    
+    products = {}
+    if product_ids:
+        products = {p.id: p for p in Product.query.filter(Product.id.in_(product_ids))}
+    users = {}
+    if user_ids:
+        users = {u.id: u for u in User.query.filter(User.id.in_(user_ids))}
+    
+    # A block never changes once mined, but the product and user names
+    # shown next to its transactions can, so they are part of the ETag
+    etag = _page_etag(
+        'block', block.hash,
+        sorted((p.id, p.name) for p in products.values()),
+        sorted((u.id, u.full_name, u.role) for u in users.values())
+    )
+    not_modified = _not_modified(etag)
+    if not_modified:
+        return not_modified
     
     # Get transaction details with user and product info
-    enhanced_transactions = []
-    for tx in block.transactions:
-        # Get related product and users
-        product = None
-        from_user = None
-        to_user = None
-        
-        if hasattr(tx, 'product_id') and tx.product_id:
-            product = Product.query.get(tx.product_id)
-        
-        if hasattr(tx, 'from_user_id') and tx.from_user_id:
-            from_user = User.query.get(tx.from_user_id)
-            
-        if hasattr(tx, 'to_user_id') and tx.to_user_id:
-            to_user = User.query.get(tx.to_user_id)
-        
-        enhanced_transactions.append({
-            'transaction': tx,
-            'product': product,
-            'from_user': from_user,
-            'to_user': to_user
-        })
-    
-    return render_template('blockchain/block_detail.html',
+    enhanced_transactions = [{
+        'transaction': tx,
+        'product': products.get(tx.get('product_id')),
+        'from_user': users.get(tx.get('from_user_id')),
+        'to_user': users.get(tx.get('to_user_id'))
+    } for tx in transactions]
+    
+    return _with_etag(render_template('blockchain/block_detail.html',
                          block=block,
-                         enhanced_transactions=enhanced_transactions)
+                         enhanced_transactions=enhanced_transactions), etag)
 
 @blockchain_bp.route('/transaction/<transaction_id>')
 @login_required
@@ -108,39 +166,35 @@ def view_transaction(transaction_id):
     """
     View detailed information about a specific transaction
     """
-    # Find transaction in blockchain
-    transaction_data = None
-    block_index = None
+    blockchain = get_blockchain()
+    # Find transaction in blockchain (dict lookup, no chain scan)
+    entry = blockchain.find_transaction(transaction_id)
     
-    for i, block in enumerate(food_chain_blockchain.chain):
-        for tx in block.transactions:
-            if hasattr(tx, 'transaction_id') and str(tx.transaction_id) == str(transaction_id):
-                transaction_data = {
-                    'transaction': tx,
-                    'block': block,
-                    'block_index': i
-                }
-                break
-        if transaction_data:
-            break
-    
-    if not transaction_data:
+    if not entry:
         flash('Transaction not found', 'danger')
         return redirect(url_for('blockchain.explorer'))
     
-    # Get related data
+    block_index, tx = entry
+    transaction_data = {
+        'transaction': tx,
+        'block': blockchain.chain[block_index],
+        'block_index': block_index
+    }
+    
+    # Get related data (session.get() returns rows already in the
+    # identity map without querying again)
     product = None
     from_user = None
     to_user = None
     
-    if hasattr(transaction_data['transaction'], 'product_id') and transaction_data['transaction'].product_id:
-        product = Product.query.get(transaction_data['transaction'].product_id)
+    if tx.get('product_id'):
+        product = db.session.get(Product, tx.get('product_id'))
     
-    if hasattr(transaction_data['transaction'], 'from_user_id') and transaction_data['transaction'].from_user_id:
-        from_user = User.query.get(transaction_data['transaction'].from_user_id)
+    if tx.get('from_user_id'):
+        from_user = db.session.get(User, tx.get('from_user_id'))
         
-    if hasattr(transaction_data['transaction'], 'to_user_id') and transaction_data['transaction'].to_user_id:
-        to_user = User.query.get(transaction_data['transaction'].to_user_id)
+    if tx.get('to_user_id'):
+        to_user = db.session.get(User, tx.get('to_user_id'))
     
     return render_template('blockchain/transaction_detail.html',
                          transaction_data=transaction_data,
@@ -154,44 +208,12 @@ def verify_blockchain():
     """
     Verify blockchain integrity
     """
-    # Simple verification - check if chain exists and has blocks
-    is_valid = len(food_chain_blockchain.chain) > 0
-    
-    # Get detailed verification results
-    verification_results = []
-    
-    if len(food_chain_blockchain.chain) > 1:
-        for i, block in enumerate(food_chain_blockchain.chain[1:], 1):  # Skip genesis block
-            prev_block = food_chain_blockchain.chain[i - 1] if i > 0 else None
-            
-            # Basic checks
-            block_valid = True
-            prev_hash_valid = True
-            
-            try:
-                # Check if block hash exists
-                block_valid = hasattr(block, 'hash') and block.hash and len(block.hash) > 0
-                
-                # Check if previous hash matches (if we have a previous block)
-                if prev_block:
-                    prev_hash_valid = (hasattr(block, 'previous_hash') and 
-                                     hasattr(prev_block, 'hash') and
-                                     block.previous_hash == prev_block.hash)
-            except Exception as e:
-                print(f"Verification error for block {i}: {e}")
-                block_valid = False
-                prev_hash_valid = False
-            
-            verification_results.append({
-                'index': i,
-                'block': block,
-                'is_valid': block_valid and prev_hash_valid,
-                'block_hash_valid': block_valid,
-                'prev_hash_valid': prev_hash_valid
-            })
+    # Results for blocks already checked are kept on the blockchain, so
+    # only newly added blocks are looked at here
+    verification_results = get_blockchain().get_verification_results()
     
     # Overall validation
-    is_valid = all(result['is_valid'] for result in verification_results) if verification_results else True
+    is_valid = all(result['is_valid'] for result in verification_results)
     
     return render_template('blockchain/verification.html',
                          is_valid=is_valid,
@@ -203,67 +225,15 @@ def blockchain_stats():
     """
     Blockchain statistics and analytics
     """
-    chain = food_chain_blockchain.chain
-    
-    stats = {
-        'total_blocks': len(chain),
-        'total_transactions': sum(len(block.transactions) for block in chain),
-        'chain_size_bytes': sum(len(str(block)) for block in chain),
-        'average_block_size': 0,
-        'mining_difficulty': getattr(food_chain_blockchain, 'difficulty', 2),
-        'genesis_timestamp': chain[0].timestamp if chain else None,
-        'latest_timestamp': chain[-1].timestamp if chain else None
-    }
-    
-    if stats['total_blocks'] > 0:
-        stats['average_block_size'] = stats['chain_size_bytes'] / stats['total_blocks']
-    
-    # Transaction types distribution
-    tx_types = {}
-    for block in chain:
-        for tx in block.transactions:
-            tx_type = getattr(tx, 'transaction_type', 'unknown')
-            tx_types[tx_type] = tx_types.get(tx_type, 0) + 1
-    
-    # Daily transaction volume (last 30 days)
-    from datetime import datetime, timedelta
-    daily_volumes = {}
-    
-    for block in chain:
-        try:
-            if hasattr(block, 'timestamp') and block.timestamp:
-                # Handle different timestamp formats
-                if isinstance(block.timestamp, str):
-                    # Try parsing ISO format
-                    try:
-                        block_date = datetime.fromisoformat(block.timestamp.replace('Z', '+00:00')).date()
-                    except ValueError:
-                        # Try other common formats
-                        try:
-                            block_date = datetime.strptime(block.timestamp[:19], '%Y-%m-%d %H:%M:%S').date()
-                        except ValueError:
-                            continue
-                else:
-                    block_date = block.timestamp.date()
-                    
-                daily_volumes[block_date.isoformat()] = daily_volumes.get(block_date.isoformat(), 0) + len(block.transactions)
-        except Exception as e:
-            print(f"Error processing block timestamp: {e}")
-            continue
-    
-    # Block size distribution
-    block_sizes = []
-    for block in chain:
-        try:
-            block_sizes.append(len(str(block)))
-        except:
-            block_sizes.append(0)
+    # Counters are kept up to date as blocks are added, so this is O(1)
+    # in the chain length instead of a walk over every block
+    blockchain_stats = get_blockchain().get_stats()
     
     return render_template('blockchain/stats.html',
-                         stats=stats,
-                         tx_types=tx_types,
-                         daily_volumes=daily_volumes,
-                         block_sizes=block_sizes)
+                         stats=blockchain_stats['stats'],
+                         tx_types=blockchain_stats['tx_types'],
+                         daily_volumes=blockchain_stats['daily_volumes'],
+                         block_sizes=blockchain_stats['block_sizes'])
 
 @blockchain_bp.route('/api/search')
 @login_required
@@ -271,6 +241,7 @@ def api_search():
     """
     Search blockchain by hash, transaction ID, or product batch ID
     """
+    blockchain = get_blockchain()
     query = request.args.get('q', '').strip()
     
     if not query:
@@ -283,42 +254,40 @@ def api_search():
     }
     
     try:
-        # Search blocks by hash or index
-        for i, block in enumerate(food_chain_blockchain.chain):
-            try:
-                block_hash = getattr(block, 'hash', '')
-                if (query.lower() in block_hash.lower()) or (str(i) == query):
-                    results['blocks'].append({
-                        'index': i,
-                        'hash': block_hash,
-                        'timestamp': getattr(block, 'timestamp', ''),
-                        'transaction_count': len(getattr(block, 'transactions', []))
-                    })
-            except Exception as e:
-                print(f"Error searching block {i}: {e}")
-                continue
+        # Search blocks by hash or index (through the hash prefix index)
+        block_indexes = blockchain.search_block_hashes(query)
+        if query.isdigit() and int(query) < len(blockchain.chain) and int(query) not in block_indexes:
+            block_indexes = sorted(block_indexes + [int(query)])
+        
+        for i in block_indexes:
+            block = blockchain.chain[i]
+            results['blocks'].append({
+                'index': i,
+                'hash': block.hash,
+                'timestamp': block.timestamp,
+                'transaction_count': len(block.transactions)
+            })
         
-        # Search transactions
-        for i, block in enumerate(food_chain_blockchain.chain):
-            try:
-                for tx in getattr(block, 'transactions', []):
-                    tx_id = getattr(tx, 'transaction_id', None)
-                    product_id = getattr(tx, 'product_id', None)
-                    
-                    if (tx_id and query in str(tx_id)) or (product_id and query in str(product_id)):
-                        results['transactions'].append({
-                            'transaction_id': tx_id or 'N/A',
-                            'product_id': product_id or 'N/A',
-                            'block_index': i,
-                            'type': getattr(tx, 'transaction_type', 'unknown')
-                        })
-            except Exception as e:
-                print(f"Error searching transactions in block {i}: {e}")
-                continue
+        # Transaction IDs and batch IDs are never bare hex, so a full
+        # block hash can't match anything else
+        if _FULL_HASH_RE.fullmatch(query):
+            return Response(_dumps_bytes(results), mimetype='application/json')
+        
+        # Search transactions by ID or product ID
+        for i, tx in blockchain.search_transactions(query):
+            results['transactions'].append({
+                'transaction_id': tx.get('transaction_id') or 'N/A',
+                'product_id': tx.get('product_id') or 'N/A',
+                'block_index': i,
+                'type': tx.get('transaction_type') or 'unknown'
+            })
         
         # Search products by batch ID or name
         try:
-            products = Product.query.filter(
+            # Only the columns shown in the results are loaded
+            products = Product.query.options(
+                load_only(Product.id, Product.name, Product.batch_id, Product.category)
+            ).filter(
                 (Product.batch_id.contains(query)) | 
                 (Product.name.contains(query))
             ).limit(10).all()
@@ -337,7 +306,7 @@ def api_search():
         print(f"Search error: {e}")
         return jsonify({'error': f'Search failed: {str(e)}'}), 500
     
-    return jsonify(results)
+    return Response(_dumps_bytes(results), mimetype='application/json')
 
 @blockchain_bp.route('/api/block/<int:index>')
 @login_required
@@ -345,42 +314,21 @@ def api_block_detail(index):
     """
     API endpoint for block details
     """
-    if index >= len(food_chain_blockchain.chain) or index < 0:
+    blockchain = get_blockchain()
+    if index >= len(blockchain.chain) or index < 0:
         return jsonify({'error': 'Block not found'}), 404
     
     try:
-        block = food_chain_blockchain.chain[index]
-        
-        # Convert block to dictionary
-        block_data = {
-            'index': getattr(block, 'index', index),
-            'hash': getattr(block, 'hash', ''),
-            'previous_hash': getattr(block, 'previous_hash', ''),
-            'timestamp': getattr(block, 'timestamp', ''),
-            'nonce': getattr(block, 'nonce', 0),
-            'transactions': []
-        }
-        
-        # Add transaction data
-        for tx in getattr(block, 'transactions', []):
-            try:
-                tx_data = {
-                    'transaction_id': getattr(tx, 'transaction_id', None),
-                    'transaction_type': getattr(tx, 'transaction_type', 'unknown'),
-                    'product_id': getattr(tx, 'product_id', None),
-                    'from_user_id': getattr(tx, 'from_user_id', None),
-                    'to_user_id': getattr(tx, 'to_user_id', None),
-                    'quantity': getattr(tx, 'quantity', None),
-                    'location': getattr(tx, 'location', None),
-                    'temperature': getattr(tx, 'temperature', None),
-                    'humidity': getattr(tx, 'humidity', None)
-                }
-                block_data['transactions'].append(tx_data)
-            except Exception as e:
-                print(f"Error processing transaction: {e}")
-                continue
+        block = blockchain.chain[index]
         
-        return jsonify(block_data)
+        # The chain can be rebuilt under the same index, so clients
+        # revalidate and the block hash ETag decides if it changed
+        response = Response(block.to_api_json(), mimetype='application/json')
+        response.set_etag(block.hash)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.cache_control.max_age = 60
+        return response.make_conditional(request)
     
     except Exception as e:
         print(f"Error getting block details: {e}")
@@ -392,14 +340,15 @@ def network_status():
     """
     Show blockchain network status and peers (for future multi-node support)
     """
+    blockchain = get_blockchain()
     try:
         network_info = {
             'node_id': 'local-node-001',  # This would be dynamic in a real network
             'network_status': 'operational',
             'connected_peers': 0,  # No peers in local setup
             'sync_status': 'synchronized',
-            'last_block_time': food_chain_blockchain.chain[-1].timestamp if food_chain_blockchain.chain else None,
-            'blockchain_height': len(food_chain_blockchain.chain)
+            'last_block_time': blockchain.chain[-1].timestamp if blockchain.chain else None,
+            'blockchain_height': len(blockchain.chain)
         }
     except Exception as e:
         print(f"Error getting network status: {e}")
@@ -2,15 +2,18 @@
 Dashboard routes for main application interface
 """
 
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, render_template, request, make_response
 from flask_login import login_required, current_user
-from sqlalchemy import func, desc
-from datetime import datetime, timedelta
+from sqlalchemy import bindparam, case, exists, func, desc, literal, null, select, union_all
+from sqlalchemy.orm import lazyload, load_only, selectinload
+from datetime import date, datetime, timedelta
+import hashlib
 
-from models.database import db
+from models.database import db, cached_query, count_rows, run_queries_concurrently
 from models.user import User
 from models.product import Product
 from models.blockchain import Transaction, get_blockchain_info
+from routes import json_response
 
 # Create blueprint for dashboard routes
 dashboard_bp = Blueprint('dashboard', __name__)
@@ -22,17 +25,19 @@ def main():
     Main dashboard page
     Shows different content based on user role
     """
-    # Get blockchain information
-    blockchain_info = get_blockchain_info()
-    
-    # Get user statistics
-    user_stats = get_user_statistics(current_user)
-    
-    # Get recent activities
-    recent_activities = get_recent_activities(current_user)
+    # Get blockchain information (the dashboard shows the validity badge)
+    blockchain_info = get_blockchain_info(validate=True)
     
-    # Get system overview (for all users)
-    system_overview = get_system_overview()
+    # User statistics, recent activities and the system overview are
+    # independent queries, so they run at the same time
+    results = run_queries_concurrently({
+        'user_stats': (_for_user, (get_user_statistics, current_user.id)),
+        'recent_activities': (_for_user, (get_recent_activities, current_user.id)),
+        'system_overview': (get_system_overview, ())
+    })
+    user_stats = results['user_stats']
+    recent_activities = results['recent_activities']
+    system_overview = results['system_overview']
     
     return render_template('dashboard/main.html',
                          user=current_user,
@@ -41,6 +46,13 @@ def main():
                          recent_activities=recent_activities,
                          system_overview=system_overview)
 
+def _for_user(func, user_id):
+    """
+    Call a per-user helper from a worker thread
+    The user is loaded again so it belongs to this thread's session
+    """
+    return func(db.session.get(User, user_id))
+
 @dashboard_bp.route('/overview')
 @login_required
 def overview():
@@ -48,158 +60,218 @@ def overview():
     System overview page with detailed statistics
     """
     # Get comprehensive system statistics
-    stats = {
+    stats = get_overview_stats()
+    
+    # Get blockchain info
+    blockchain_info = get_blockchain_info()
+    
+    # Get recent products (only the columns the listing shows, and not
+    # their transaction histories)
+    recent_products = Product.query.options(
+        load_only(Product.id, Product.name, Product.batch_id, Product.category,
+                  Product.status, Product.created_at),
+        lazyload(Product.transactions)
+    ).order_by(desc(Product.created_at)).limit(10).all()
+    
+    # Get recent transactions, with just the name of each product
+    recent_transactions = Transaction.query.options(
+        load_only(Transaction.id, Transaction.transaction_id, Transaction.transaction_type,
+                  Transaction.product_id, Transaction.quantity, Transaction.timestamp),
+        selectinload(Transaction.product).load_only(Product.id, Product.name).lazyload(Product.transactions)
+    ).order_by(desc(Transaction.timestamp)).limit(10).all()
+    
+    return render_template('dashboard/overview.html',
+                         stats=stats,
+                         blockchain_info=blockchain_info,
+                         recent_products=recent_products,
+                         recent_transactions=recent_transactions)
+
+@cached_query(timeout=30)
+def get_overview_stats():
+    """
+    Get the user, product and transaction counts for the overview page
+    """
+    # One GROUP BY per table instead of a COUNT query per role / status
+    role_counts = _role_counts()
+    status_counts = _status_counts()
+    today = datetime.combine(date.today(), datetime.min.time())
+    return {
         'users': {
-            'total': User.query.count(),
-            'farmers': User.query.filter_by(role='farmer').count(),
-            'distributors': User.query.filter_by(role='distributor').count(),
-            'retailers': User.query.filter_by(role='retailer').count(),
-            'inspectors': User.query.filter_by(role='inspector').count(),
+            'total': sum(role_counts.values()),
+            'farmers': role_counts.get('farmer', 0),
+            'distributors': role_counts.get('distributor', 0),
+            'retailers': role_counts.get('retailer', 0),
+            'inspectors': role_counts.get('inspector', 0),
         },
         'products': {
-            'total': Product.query.count(),
-            'active': Product.query.filter(Product.status != 'expired').count(),
-            'expired': Product.query.filter(Product.status == 'expired').count(),
-            'in_transit': Product.query.filter_by(status='in_transit').count(),
+            'total': sum(status_counts.values()),
+            # Matches status != 'expired' in SQL, which also skips NULL statuses
+            'active': sum(count for status, count in status_counts.items()
+                          if status is not None and status != 'expired'),
+            'expired': status_counts.get('expired', 0),
+            'in_transit': status_counts.get('in_transit', 0),
         },
         'transactions': {
-            'total': Transaction.query.count(),
+            'total': count_rows(Transaction),
+            # Range on the raw column so the timestamp index can be used
             'today': Transaction.query.filter(
-                func.date(Transaction.timestamp) == datetime.now().date()
+                Transaction.timestamp >= today, Transaction.timestamp < today + timedelta(days=1)
             ).count(),
             'this_week': Transaction.query.filter(
                 Transaction.timestamp >= datetime.now() - timedelta(days=7)
             ).count(),
         }
     }
-    
-    # Get blockchain info
-    blockchain_info = get_blockchain_info()
-    
-    # Get recent products
-    recent_products = Product.query.order_by(desc(Product.created_at)).limit(10).all()
-    
-    # Get recent transactions
-    recent_transactions = Transaction.query.order_by(desc(Transaction.timestamp)).limit(10).all()
-    
-    return render_template('dashboard/overview.html',
-                         stats=stats,
-                         blockchain_info=blockchain_info,
-                         recent_products=recent_products,
-                         recent_transactions=recent_transactions)
+
+def _role_counts():
+    """
+    Number of users per role, from a single GROUP BY query
+    """
+    return dict(db.session.query(User.role, func.count(User.id)).group_by(User.role).all())
+
+def _status_counts():
+    """
+    Number of products per status, from a single GROUP BY query
+    """
+    return dict(db.session.query(Product.status, func.count(Product.id)).group_by(Product.status).all())
 
 def get_user_statistics(user):
     """
     Get statistics specific to the current user
     """
-    from models.product import Product
-    from models.blockchain import Transaction
-    
+    return _user_statistics(user.id, user.role)
+
+@cached_query(timeout=300)
+def _user_statistics(user_id, role):
+    """
+    Per-user statistics, kept until product or transaction data changes
+    (so repeated dashboard loads read stored numbers instead of re-aggregating)
+    """
     stats = {}
     
-    if user.role == 'farmer':
+    if role == 'farmer':
+        products = db.session.execute(_SELECT_CREATOR_PRODUCT_STATS, {'user_id': user_id}).one()
+        transactions = db.session.execute(_SELECT_USER_TRANSACTION_COUNTS, {'user_id': user_id}).one()
         stats = {
-            'products_created': Product.query.filter_by(created_by=user.id).count(),
-            'active_products': Product.query.filter_by(created_by=user.id).filter(Product.status != 'expired').count(),
-            'total_quantity': db.session.query(func.sum(Product.quantity)).filter_by(created_by=user.id).scalar() or 0,
-            'transactions_sent': Transaction.query.filter_by(from_user_id=user.id).count(),
+            'products_created': products.created,
+            'active_products': products.active,
+            'total_quantity': products.total_quantity,
+            'transactions_sent': transactions.sent,
         }
     
-    elif user.role in ['distributor', 'retailer']:
+    elif role in ['distributor', 'retailer']:
+        products = db.session.execute(_SELECT_OWNER_PRODUCT_STATS, {'user_id': user_id}).one()
+        transactions = db.session.execute(_SELECT_USER_TRANSACTION_COUNTS, {'user_id': user_id}).one()
         stats = {
-            'products_owned': Product.query.filter_by(current_owner_id=user.id).count(),
-            'transactions_sent': Transaction.query.filter_by(from_user_id=user.id).count(),
-            'transactions_received': Transaction.query.filter_by(to_user_id=user.id).count(),
-            'products_in_transit': Product.query.filter_by(current_owner_id=user.id, status='in_transit').count(),
+            'products_owned': products.owned,
+            'transactions_sent': transactions.sent,
+            'transactions_received': transactions.received,
+            'products_in_transit': products.in_transit,
         }
     
-    elif user.role == 'inspector':
+    elif role == 'inspector':
+        counts = db.session.execute(_SELECT_INSPECTOR_COUNTS).one()
         stats = {
-            'total_products': Product.query.count(),
-            'total_transactions': Transaction.query.count(),
+            'total_products': counts.total_products,
+            'total_transactions': counts.total_transactions,
             'products_inspected': 0,  # This could be enhanced with inspection records
-            'quality_issues': Product.query.filter(Product.quality_score < 70).count(),
+            'quality_issues': counts.quality_issues,
         }
     
     return stats
 
+def _activity_select(activity_type, counterparty_id, *conditions):
+    """
+    Select one kind of activity as typed rows with only the columns the
+    descriptions need (counterparty_id: user column to name, or None)
+    """
+    if counterparty_id is None:
+        counterparty = null()
+    else:
+        counterparty = User.full_name
+    
+    query = select(
+        literal(activity_type).label('type'),
+        Transaction.product_id,
+        Product.name.label('product_name'),
+        counterparty.label('counterparty'),
+        Transaction.timestamp
+    ).join(Product, Transaction.product_id == Product.id)
+    if counterparty_id is not None:
+        query = query.outerjoin(User, User.id == counterparty_id)
+    return query.where(*conditions)
+
 def get_recent_activities(user, limit=10):
     """
     Get recent activities for the current user
     """
-    activities = []
+    # Created, sent and received transactions in one UNION ALL; the
+    # database merges and sorts them, so up to `limit` real activities come back
+    typed_rows = union_all(
+        _activity_select('created', None,
+                         Transaction.transaction_type == 'create',
+                         Transaction.from_user_id == user.id),
+        _activity_select('sent', Transaction.to_user_id,
+                         Transaction.transaction_type == 'transfer',
+                         Transaction.from_user_id == user.id,
+                         Transaction.to_user_id != user.id),
+        _activity_select('received', Transaction.from_user_id,
+                         Transaction.transaction_type == 'transfer',
+                         Transaction.to_user_id == user.id,
+                         Transaction.from_user_id != user.id)
+    ).subquery()
     
-    # Get recent transactions involving this user (avoid duplicates)
-    recent_transactions = Transaction.query.filter(
-        (Transaction.from_user_id == user.id) | (Transaction.to_user_id == user.id)
-    ).order_by(desc(Transaction.timestamp)).limit(limit).all()
+    # Duplicates (same kind, product and time) are dropped in SQL by
+    # keeping the first row of each group
+    row_number = func.row_number().over(
+        partition_by=(typed_rows.c.type, typed_rows.c.product_id, typed_rows.c.timestamp)
+    ).label('row_number')
+    ranked = select(typed_rows, row_number).subquery()
+    activity_rows = db.session.execute(
+        select(ranked.c.type, ranked.c.product_id, ranked.c.product_name,
+               ranked.c.counterparty, ranked.c.timestamp)
+        .where(ranked.c.row_number == 1)
+        .order_by(desc(ranked.c.timestamp)).limit(limit)
+    ).all()
     
-    for transaction in recent_transactions:
-        # Determine activity type based on transaction type and user role
-        if transaction.transaction_type == 'create':
-            # Only show "Created" for product creation
-            if transaction.from_user_id == user.id:
-                activities.append({
-                    'type': 'created',
-                    'description': f"Created {transaction.product.name}",
-                    'timestamp': transaction.timestamp,
-                    'transaction': transaction
-                })
-        elif transaction.transaction_type == 'transfer':
-            # Only show transfer activities for actual transfers
-            if transaction.from_user_id == user.id and transaction.to_user_id != user.id:
-                # User sent the product to someone else
-                to_user = User.query.get(transaction.to_user_id)
-                activities.append({
-                    'type': 'sent',
-                    'description': f"Sent {transaction.product.name} to {to_user.full_name if to_user else 'Unknown'}",
-                    'timestamp': transaction.timestamp,
-                    'transaction': transaction
-                })
-            elif transaction.to_user_id == user.id and transaction.from_user_id != user.id:
-                # User received the product from someone else
-                from_user = User.query.get(transaction.from_user_id)
-                activities.append({
-                    'type': 'received',
-                    'description': f"Received {transaction.product.name} from {from_user.full_name if from_user else 'Unknown'}",
-                    'timestamp': transaction.timestamp,
-                    'transaction': transaction
-                })
+    # Structured rows; the template and main.js turn them into text
+    activities = [{
+        'type': row.type,
+        'product_id': row.product_id,
+        'product_name': row.product_name,
+        'counterparty_name': row.counterparty,
+        'timestamp': row.timestamp
+    } for row in activity_rows]
     
-    # Get recently created products (for farmers) - but only if not already in transactions
+    # Get recently created products (for farmers) that have no 'create'
+    # transaction, so they aren't already listed above
     if user.role == 'farmer':
-        recent_products = user.products_created.order_by(desc(Product.created_at)).limit(5).all()
-        existing_product_ids = [activity['transaction'].product_id for activity in activities if 'transaction' in activity]
+        has_create_transaction = exists().where(
+            Transaction.product_id == Product.id,
+            Transaction.from_user_id == user.id,
+            Transaction.transaction_type == 'create'
+        )
+        recent_products = db.session.execute(
+            select(Product.id, Product.name, Product.created_at)
+            .where(Product.created_by == user.id, ~has_create_transaction)
+            .order_by(desc(Product.created_at)).limit(5)
+        ).all()
         
         for product in recent_products:
-            if product.id not in existing_product_ids:
-                activities.append({
-                    'type': 'created',
-                    'description': f"Created {product.name}",
-                    'timestamp': product.created_at,
-                    'product': product
-                })
+            activities.append({
+                'type': 'created',
+                'product_id': product.id,
+                'product_name': product.name,
+                'counterparty_name': None,
+                'timestamp': product.created_at
+            })
     
-    # Sort activities by timestamp and remove duplicates
+    # Transaction rows are already unique and the product rows never
+    # overlap them, so merging only needs a sort
     activities.sort(key=lambda x: x['timestamp'], reverse=True)
-    
-    # Remove duplicate activities for the same product
-    seen_activities = set()
-    unique_activities = []
-    
-    for activity in activities:
-        # Create a unique key for each activity
-        if 'transaction' in activity:
-            key = f"{activity['type']}_{activity['transaction'].product_id}_{activity['timestamp']}"
-        else:
-            key = f"{activity['type']}_{activity['product'].id}_{activity['timestamp']}"
-        
-        if key not in seen_activities:
-            seen_activities.add(key)
-            unique_activities.append(activity)
-    
-    return unique_activities[:limit]
+    return activities[:limit]
 
+@cached_query(timeout=60)
 def get_system_overview():
     """
     Get system-wide overview statistics
@@ -210,19 +282,15 @@ def get_system_overview():
         func.count(Product.id).label('count')
     ).group_by(Product.category).all()
     
-    # Quality distribution
+    # Quality distribution and temperature alerts (products outside the
+    # safe range) in one pass over the products table
+    counts = db.session.execute(_SELECT_QUALITY_AND_ALERT_COUNTS).one()
     quality_stats = {
-        'high_quality': Product.query.filter(Product.quality_score >= 80).count(),
-        'medium_quality': Product.query.filter(
-            (Product.quality_score >= 60) & (Product.quality_score < 80)
-        ).count(),
-        'low_quality': Product.query.filter(Product.quality_score < 60).count(),
+        'high_quality': counts.high_quality,
+        'medium_quality': counts.medium_quality,
+        'low_quality': counts.low_quality,
     }
-    
-    # Temperature alerts (products outside safe range)
-    temp_alerts = Product.query.filter(
-        (Product.temperature < 0) | (Product.temperature > 25)
-    ).count()
+    temp_alerts = counts.temperature_alerts
     
     return {
         'category_stats': dict(category_stats),
@@ -231,30 +299,106 @@ def get_system_overview():
         'blockchain_status': 'operational'  # This could be enhanced with actual checks
     }
 
+def _activities_json(activities):
+    """
+    Convert activities to a JSON-serializable format
+    """
+    return [{
+        'type': activity['type'],
+        'product_id': activity['product_id'],
+        'product_name': activity['product_name'],
+        'counterparty_name': activity['counterparty_name'],
+        'timestamp': activity['timestamp'].isoformat(),
+    } for activity in activities]
+
+def _data_etag(name, user):
+    """
+    Build an ETag for a user's dashboard data from the newest
+    transaction/product change (the same marks as the analytics charts)
+    """
+    state = db.session.query(
+        select(func.max(Transaction.timestamp)).scalar_subquery(),
+        select(func.max(Product.updated_at)).scalar_subquery(),
+        select(func.count()).select_from(Product).scalar_subquery()
+    ).one()
+    key = f"{name}|{user.id}|{request.query_string.decode()}|{tuple(state)}"
+    return hashlib.md5(key.encode()).hexdigest()
+
+def _polled_json(name, build):
+    """
+    Answer a polled JSON endpoint, or 304 if the client's copy is current
+    The data is only built when the ETag has changed
+    """
+    etag = _data_etag(name, current_user)
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = json_response(build())
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = 10
+    return response
+
+@dashboard_bp.route('/api/dashboard')
+@login_required
+def api_dashboard():
+    """
+    API endpoint for the dashboard's AJAX updates
+    Returns quick statistics and recent activities in one response
+    """
+    return _polled_json('dashboard', lambda: {
+        'stats': get_user_statistics(current_user),
+        'activities': _activities_json(get_recent_activities(current_user, limit=5))
+    })
+
 @dashboard_bp.route('/api/quick_stats')
 @login_required
 def api_quick_stats():
     """
-    API endpoint for quick statistics (for AJAX updates)
+    API endpoint for quick statistics
+    Deprecated: the dashboard now polls /api/dashboard
     """
-    stats = get_user_statistics(current_user)
-    return jsonify(stats)
+    return _polled_json('quick_stats', lambda: get_user_statistics(current_user))
 
 @dashboard_bp.route('/api/recent_activities')
 @login_required
 def api_recent_activities():
     """
-    API endpoint for recent activities (for AJAX updates)
+    API endpoint for recent activities
+    Deprecated: the dashboard now polls /api/dashboard
     """
-    activities = get_recent_activities(current_user, limit=5)
-    
-    # Convert to JSON-serializable format
-    activities_json = []
-    for activity in activities:
-        activities_json.append({
-            'type': activity['type'],
-            'description': activity['description'],
-            'timestamp': activity['timestamp'].isoformat(),
-        })
-    
-    return jsonify(activities_json)
\ No newline at end of file
+    return _polled_json('recent_activities',
+                        lambda: _activities_json(get_recent_activities(current_user, limit=5)))
+
+# COUNT of a CASE counts only the rows where it is not NULL
+_SELECT_QUALITY_AND_ALERT_COUNTS = select(
+    func.count(case((Product.quality_score >= 80, 1))).label('high_quality'),
+    func.count(case(((Product.quality_score >= 60) & (Product.quality_score < 80), 1))).label('medium_quality'),
+    func.count(case((Product.quality_score < 60, 1))).label('low_quality'),
+    func.count(case(((Product.temperature < 0) | (Product.temperature > 25), 1))).label('temperature_alerts')
+)
+
+# Per-user statistics, built once so SQLAlchemy's compiled statement cache
+# is hit on every dashboard load (only the user_id parameter changes)
+_SELECT_CREATOR_PRODUCT_STATS = select(
+    func.count(Product.id).label('created'),
+    func.count(case((Product.status != 'expired', 1))).label('active'),
+    func.coalesce(func.sum(Product.quantity), 0).label('total_quantity')
+).where(Product.created_by == bindparam('user_id'))
+
+_SELECT_OWNER_PRODUCT_STATS = select(
+    func.count(Product.id).label('owned'),
+    func.count(case((Product.status == 'in_transit', 1))).label('in_transit')
+).where(Product.current_owner_id == bindparam('user_id'))
+
+_SELECT_USER_TRANSACTION_COUNTS = select(
+    func.count(case((Transaction.from_user_id == bindparam('user_id'), 1))).label('sent'),
+    func.count(case((Transaction.to_user_id == bindparam('user_id'), 1))).label('received')
+).where((Transaction.from_user_id == bindparam('user_id')) | (Transaction.to_user_id == bindparam('user_id')))
+
+# Inspector totals in one round trip
+_SELECT_INSPECTOR_COUNTS = select(
+    func.count(Product.id).label('total_products'),
+    select(func.count()).select_from(Transaction).scalar_subquery().label('total_transactions'),
+    func.count(case((Product.quality_score < 70, 1))).label('quality_issues')
+)
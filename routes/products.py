@@ -2,46 +2,177 @@
 Product management routes for supply chain operations
 """
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, abort, make_response
 from flask_login import login_required, current_user
-from datetime import datetime, date
+from datetime import date
+import hashlib
 import json
+import re
 
-from models.database import db
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.orm import joinedload, lazyload, load_only, selectinload, undefer
+
+from models.database import db, cached_query
+from routes import json_response
 from models.user import User
-from models.product import Product
-from models.blockchain import Transaction, add_product_transaction, mine_new_block, food_chain_blockchain
+from models.product import Product, PRODUCT_CATEGORIES
+from models.blockchain import Transaction, add_product_transaction, request_mining, get_blockchain
 
 # Create blueprint for product routes
 products_bp = Blueprint('products', __name__)
 
+# Columns shown on the product cards of the list and search pages
+# (including the deferred description)
+_CARD_COLUMNS = (
+    Product.id, Product.batch_id, Product.name, Product.category, Product.description,
+    Product.quantity, Product.unit, Product.status, Product.quality_score,
+    Product.temperature, Product.humidity, Product.expiry_date, Product.current_owner_id
+)
+
+# Most products shown on one search page
+SEARCH_RESULT_LIMIT = 100
+
+# Who each role hands its products on to
+RECIPIENT_ROLE = {
+    'farmer': 'distributor',
+    'distributor': 'retailer'
+}
+
+def _keyset_page(query, per_page, after_id=None, before_id=None):
+    """
+    Fetch one page of products, newest first, keyed on the product id
+    Pages are found with an index seek (id < after_id or id > before_id)
+    instead of COUNT(*) plus OFFSET, so deep pages cost the same as the first
+
+    Returns:
+        Tuple of (products, prev_before_id, next_after_id); the ids are
+        None when there is no previous / next page
+    """
+    if before_id:
+        # Going back: read the page just above before_id, then flip it
+        rows = query.filter(Product.id > before_id).order_by(Product.id.asc()).limit(per_page + 1).all()
+        has_prev = len(rows) > per_page
+        products = rows[:per_page][::-1]
+        prev_before_id = products[0].id if has_prev else None
+        next_after_id = products[-1].id if products else None
+    else:
+        if after_id:
+            query = query.filter(Product.id < after_id)
+        # One extra row tells whether there is a next page
+        rows = query.order_by(Product.id.desc()).limit(per_page + 1).all()
+        products = rows[:per_page]
+        prev_before_id = products[0].id if after_id and products else None
+        next_after_id = products[-1].id if len(rows) > per_page else None
+
+    return products, prev_before_id, next_after_id
+
 @products_bp.route('/')
 @login_required
 def list_products():
     """
     List all products based on user role
     """
-    page = request.args.get('page', 1, type=int)
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
     per_page = 20
     
+    # Only the card columns, and no transactions (the cards don't show them)
+    products_query = Product.query.options(load_only(*_CARD_COLUMNS), lazyload(Product.transactions))
+    
     # Filter products based on user role
     if current_user.role == 'farmer':
         # Farmers see products they created
-        products = Product.query.filter_by(created_by=current_user.id).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        products_query = products_query.filter_by(created_by=current_user.id)
     elif current_user.role in ['distributor', 'retailer']:
         # Distributors and retailers see products they own
-        products = Product.query.filter_by(current_owner_id=current_user.id).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-    else:
-        # Inspectors see all products
-        products = Product.query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        products_query = products_query.filter_by(current_owner_id=current_user.id)
+    # Inspectors see all products
+    
+    products, prev_before_id, next_after_id = _keyset_page(products_query, per_page, after_id, before_id)
+    
+    return render_template('products/list.html', products=products,
+                           prev_before_id=prev_before_id, next_after_id=next_after_id)
+
+def _field(parse=str.strip, default='', check=None, message=None, invalid=None, fallback=None):
+    """
+    Describe one form field for parse_form()
+    
+    Args:
+        parse: Converts the raw string (raising ValueError if it can't)
+        default: Raw value used when the field is missing from the form
+        check: Test the parsed value must pass, else message is reported
+        invalid: Error reported when parse fails (None = use fallback quietly)
+        fallback: Value used when parse fails
+    """
+    return {'parse': parse, 'default': default, 'check': check,
+            'message': message, 'invalid': invalid, 'fallback': fallback}
+
+def _optional_text(value):
+    """
+    Stripped text, or None if blank
+    """
+    return value.strip() or None
+
+def _optional_float(value):
+    """
+    Number, or None if blank
+    """
+    return float(value) if value else None
+
+# Exact YYYY-MM-DD shape; Python 3.11's fromisoformat also takes other ISO forms
+_ISO_DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+def _optional_date(value):
+    """
+    YYYY-MM-DD date, or None if blank
+    date.fromisoformat is much faster than strptime (no format parsing)
+    """
+    if not value:
+        return None
+    if not _ISO_DATE_RE.fullmatch(value):
+        raise ValueError(f'Not a YYYY-MM-DD date: {value}')
+    return date.fromisoformat(value)
+
+# Add product form fields, built once at import time
+ADD_PRODUCT_FIELDS = {
+    'name': _field(check=lambda v: len(v) >= 2, message='Product name must be at least 2 characters long.'),
+    'category': _field(check=lambda v: v in PRODUCT_CATEGORIES, message='Please select a category.'),
+    'description': _field(),
+    'quantity': _field(float, '0', check=lambda v: v > 0, message='Quantity must be greater than 0.',
+                       invalid='Invalid quantity value.', fallback=0),
+    'unit': _field(check=bool, message='Please specify the unit.'),
+    'quality_grade': _field(_optional_text),
+    'quality_score': _field(int, '0', check=lambda v: 0 <= v <= 100,
+                            message='Quality score must be between 0 and 100.', fallback=0),
+    'origin_location': _field(_optional_text),
+    'current_location': _field(_optional_text),
+    'harvest_date': _field(_optional_date, invalid='Invalid harvest date format.'),
+    'expiry_date': _field(_optional_date, invalid='Invalid expiry date format.'),
+    'temperature': _field(_optional_float, '0'),
+    'humidity': _field(_optional_float, '0'),
+}
+
+def parse_form(form, fields):
+    """
+    Parse and validate submitted form data against a field table
     
-    return render_template('products/list.html', products=products)
+    Returns:
+        Tuple of (dict of parsed values, list of error messages)
+    """
+    data = {}
+    errors = []
+    for name, field in fields.items():
+        try:
+            value = field['parse'](form.get(name, field['default']))
+        except ValueError:
+            value = field['fallback']
+            if field['invalid']:
+                errors.append(field['invalid'])
+        else:
+            if field['check'] is not None and not field['check'](value):
+                errors.append(field['message'])
+        data[name] = value
+    return data, errors
 
 @products_bp.route('/add', methods=['GET', 'POST'])
 @login_required
@@ -54,91 +185,33 @@ def add_product():
         return redirect(url_for('products.list_products'))
     
     if request.method == 'POST':
-        # Get form data
-        name = request.form.get('name', '').strip()
-        category = request.form.get('category', '').strip()
-        description = request.form.get('description', '').strip()
-        quantity = request.form.get('quantity', '0')
-        unit = request.form.get('unit', '').strip()
-        quality_grade = request.form.get('quality_grade', '').strip()
-        quality_score = request.form.get('quality_score', '0')
-        origin_location = request.form.get('origin_location', '').strip()
-        current_location = request.form.get('current_location', '').strip()
-        harvest_date = request.form.get('harvest_date', '')
-        expiry_date = request.form.get('expiry_date', '')
-        temperature = request.form.get('temperature', '0')
-        humidity = request.form.get('humidity', '0')
-        
-        # Validate input
-        errors = []
-        if not name or len(name) < 2:
-            errors.append('Product name must be at least 2 characters long.')
-        if not category:
-            errors.append('Please select a category.')
-        
-        try:
-            quantity = float(quantity)
-            if quantity <= 0:
-                errors.append('Quantity must be greater than 0.')
-        except ValueError:
-            errors.append('Invalid quantity value.')
-            quantity = 0
-        
-        if not unit:
-            errors.append('Please specify the unit.')
-        
-        try:
-            quality_score = int(quality_score)
-            if quality_score < 0 or quality_score > 100:
-                errors.append('Quality score must be between 0 and 100.')
-        except ValueError:
-            quality_score = 0
-        
-        try:
-            temperature = float(temperature) if temperature else None
-        except ValueError:
-            temperature = None
-        
-        try:
-            humidity = float(humidity) if humidity else None
-        except ValueError:
-            humidity = None
-        
-        # Parse dates
-        harvest_date_obj = None
-        expiry_date_obj = None
-        
-        if harvest_date:
-            try:
-                harvest_date_obj = datetime.strptime(harvest_date, '%Y-%m-%d').date()
-            except ValueError:
-                errors.append('Invalid harvest date format.')
-        
-        if expiry_date:
-            try:
-                expiry_date_obj = datetime.strptime(expiry_date, '%Y-%m-%d').date()
-            except ValueError:
-                errors.append('Invalid expiry date format.')
-        
+        data, errors = parse_form(request.form, ADD_PRODUCT_FIELDS)
         if errors:
             for error in errors:
                 flash(error, 'danger')
             return render_template('products/add.html')
         
+        name = data['name']
+        quantity = data['quantity']
+        quality_score = data['quality_score']
+        current_location = data['current_location']
+        temperature = data['temperature']
+        humidity = data['humidity']
+        
         try:
             # Create product
             product = Product(
                 name=name,
-                category=category,
-                description=description,
+                category=data['category'],
+                description=data['description'],
                 quantity=quantity,
-                unit=unit,
-                quality_grade=quality_grade if quality_grade else None,
+                unit=data['unit'],
+                quality_grade=data['quality_grade'],
                 quality_score=quality_score if quality_score > 0 else None,
-                origin_location=origin_location if origin_location else None,
-                current_location=current_location if current_location else None,
-                harvest_date=harvest_date_obj,
-                expiry_date=expiry_date_obj,
+                origin_location=data['origin_location'],
+                current_location=current_location,
+                harvest_date=data['harvest_date'],
+                expiry_date=data['expiry_date'],
                 temperature=temperature,
                 humidity=humidity,
                 created_by=current_user.id
@@ -154,17 +227,18 @@ def add_product():
                 to_user_id=current_user.id,  # Initially owned by creator
                 transaction_type='create',
                 quantity=quantity,
-                location=current_location if current_location else None,
+                location=current_location,
                 temperature=temperature,
                 humidity=humidity,
-                notes=f'Product created: {name}'
+                notes=f'Product created: {name}',
+                commit=False
             )
             
-            # Commit all changes
+            # Commit the product and its transaction together
             db.session.commit()
             
-            # Mine new block
-            mine_new_block()
+            # Mine new block (in the background, with any other queued transactions)
+            request_mining()
             
             flash(f'Product "{name}" created successfully! Batch ID: {product.batch_id}', 'success')
             return redirect(url_for('products.view_product', id=product.id))
@@ -183,10 +257,17 @@ def view_product(id):
     """
     View detailed product information
     """
-    product = Product.query.get_or_404(id)
+    # Owner, creator, transactions and their users in three queries in total
+    product = Product.query.options(
+        undefer(Product.description),
+        joinedload(Product.current_owner),
+        joinedload(Product.creator),
+        selectinload(Product.transactions).joinedload(Transaction.sender),
+        selectinload(Product.transactions).joinedload(Transaction.receiver)
+    ).filter_by(id=id).first_or_404()
     
     # Get transaction history from blockchain
-    blockchain_history = food_chain_blockchain.get_product_history(product.id)
+    blockchain_history = get_blockchain().get_product_history(product.id)
     
     # Get database transaction history
     db_transactions = product.get_transaction_history()
@@ -209,7 +290,8 @@ def transfer_product(id):
     """
     Transfer product ownership
     """
-    product = Product.query.get_or_404(id)
+    # The form only needs the product's own columns
+    product = Product.query.options(lazyload(Product.transactions)).filter_by(id=id).first_or_404()
     
     # Check permissions
     if current_user.id != product.current_owner_id:
@@ -277,8 +359,6 @@ def transfer_product(id):
             if humidity is not None:
                 product.humidity = humidity
             
-            db.session.commit()
-            
             # Create blockchain transaction
             transaction = add_product_transaction(
                 product_id=product.id,
@@ -293,11 +373,15 @@ def transfer_product(id):
                 humidity=humidity,
                 vehicle_id=vehicle_id,
                 transport_method=transport_method,
-                notes=notes
+                notes=notes,
+                commit=False
             )
             
-            # Mine new block
-            mine_new_block()
+            # Commit the ownership change and its transaction together
+            db.session.commit()
+            
+            # Mine new block (in the background, with any other queued transactions)
+            request_mining()
             
             flash(f'Product transferred to {to_user.full_name} successfully!', 'success')
             return redirect(url_for('products.view_product', id=id))
@@ -308,25 +392,42 @@ def transfer_product(id):
             print(f"Transfer error: {e}")
     
     # Get possible recipients based on current user role
-    if current_user.role == 'farmer':
-        recipients = User.query.filter_by(role='distributor').all()
-    elif current_user.role == 'distributor':
-        recipients = User.query.filter_by(role='retailer').all()
-    else:
-        recipients = []
+    target_role = RECIPIENT_ROLE.get(current_user.role)
+    recipients = get_recipients(target_role) if target_role else []
     
     return render_template('products/transfer.html', product=product, recipients=recipients)
 
+@cached_query(timeout=60)
+def get_recipients(role):
+    """
+    Active users of a role, for the transfer form's recipient list
+    Plain dicts so they can be cached; cleared whenever any user changes
+    """
+    role_display = User.role_display(role)
+    rows = db.session.query(User.id, User.full_name, User.company_name)\
+        .filter_by(role=role, is_active=True).order_by(User.full_name).all()
+    return [
+        {'id': id, 'full_name': full_name, 'label': company_name or role_display}
+        for id, full_name, company_name in rows
+    ]
+
 @products_bp.route('/<int:id>/history')
 @login_required
 def product_history(id):
     """
     View complete product history with blockchain verification
     """
-    product = Product.query.get_or_404(id)
+    # The page only uses each transaction's id and its sender / receiver
+    product = Product.query.options(
+        selectinload(Product.transactions).load_only(
+            Transaction.transaction_id, Transaction.product_id, Transaction.timestamp,
+            Transaction.from_user_id, Transaction.to_user_id
+        ).joinedload(Transaction.sender),
+        selectinload(Product.transactions).joinedload(Transaction.receiver)
+    ).filter_by(id=id).first_or_404()
     
     # Get complete blockchain history
-    blockchain_history = food_chain_blockchain.get_product_history(product.id)
+    blockchain_history = get_blockchain().get_product_history(product.id)
     
     # Get database transactions for additional details
     db_transactions = {
@@ -362,15 +463,12 @@ def search_products():
     category = request.args.get('category', '')
     status = request.args.get('status', '')
     
-    # Build search query
-    products_query = Product.query
+    # Build search query (only the result cards' columns)
+    products_query = Product.query.options(load_only(*_CARD_COLUMNS), lazyload(Product.transactions))
     
     if query:
-        products_query = products_query.filter(
-            (Product.name.contains(query)) | 
-            (Product.batch_id.contains(query)) |
-            (Product.description.contains(query))
-        )
+        # Full-text index lookup instead of LIKE scans (see Product.search_condition)
+        products_query = products_query.filter(Product.search_condition(query))
     
     if category:
         products_query = products_query.filter_by(category=category)
@@ -384,47 +482,108 @@ def search_products():
     elif current_user.role in ['distributor', 'retailer']:
         products_query = products_query.filter_by(current_owner_id=current_user.id)
     
-    products = products_query.all()
+    # Newest matches first, capped so broad searches stay small
+    # (one extra row tells whether more matches were left out)
+    products = products_query.order_by(Product.id.desc()).limit(SEARCH_RESULT_LIMIT + 1).all()
+    more_results = len(products) > SEARCH_RESULT_LIMIT
+    products = products[:SEARCH_RESULT_LIMIT]
     
     # Get available categories and statuses for filters
-    categories = db.session.query(Product.category.distinct()).all()
-    statuses = db.session.query(Product.status.distinct()).all()
+    categories, statuses = get_search_filter_options()
     
     return render_template('products/search.html',
                          products=products,
-                         categories=[c[0] for c in categories],
-                         statuses=[s[0] for s in statuses],
+                         more_results=more_results,
+                         result_limit=SEARCH_RESULT_LIMIT,
+                         categories=categories,
+                         statuses=statuses,
                          current_query=query,
                          current_category=category,
                          current_status=status)
 
+@cached_query(timeout=300)
+def get_search_filter_options():
+    """
+    Categories and statuses in use, for the search filter dropdowns
+    Kept until any product is written, so searches don't rescan the table
+    """
+    categories = [category for (category,) in db.session.query(Product.category).distinct()]
+    statuses = [status for (status,) in db.session.query(Product.status).distinct()]
+    return categories, statuses
+
+def _product_etag(*versions):
+    """
+    Build an ETag for a product API response from the product's change marks
+    Today's date is included because is_expired/days_until_expiry change daily
+    """
+    key = '|'.join(str(version) for version in versions + (date.today(),))
+    return hashlib.md5(key.encode()).hexdigest()
+
+def _conditional_json(etag, build):
+    """
+    Answer a polled product API, or 304 if the client's copy is current
+    The response is only built when the ETag has changed
+    """
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = build()
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 30
+    return response
+
 @products_bp.route('/api/batch/<batch_id>')
 def api_product_by_batch(batch_id):
     """
     API endpoint to get product information by batch ID
     """
-    product = Product.query.filter_by(batch_id=batch_id).first()
-    if not product:
+    # Check the client's ETag against the product's id and last change first
+    version = db.session.execute(_SELECT_PRODUCT_VERSION_BY_BATCH, {'batch_id': batch_id}).first()
+    if not version:
         return jsonify({'error': 'Product not found'}), 404
     
-    return jsonify(product.to_dict())
+    def build():
+        product = Product.get_by_batch_id(batch_id)
+        return Response(product.to_json_bytes(), mimetype='application/json')
+    
+    return _conditional_json(_product_etag(*version), build)
 
 @products_bp.route('/api/<int:id>/track')
 def api_track_product(id):
     """
     API endpoint for product tracking information
     """
-    product = Product.query.get_or_404(id)
+    # The product's last change and newest transaction time make the ETag
+    # (one query, the newest time is an index seek on product_id, timestamp)
+    version = db.session.execute(_SELECT_PRODUCT_TRACK_VERSION, {'product_id': id}).first()
+    if not version:
+        abort(404)
     
-    # Get latest transaction for current location
-    latest_transaction = product.transactions.order_by(Transaction.timestamp.desc()).first()
+    updated_at, last_update = version
+    return _conditional_json(_product_etag(id, updated_at, last_update),
+                             lambda: _track_product_response(id, last_update))
+
+def _track_product_response(id, last_update):
+    """
+    Build the api_track_product JSON response
+    
+    Args:
+        last_update: Newest transaction time, already read for the ETag
+    """
+    # Owner joined in; the transactions themselves aren't needed
+    product = Product.query.options(
+        undefer(Product.description),
+        joinedload(Product.current_owner),
+        lazyload(Product.transactions)
+    ).filter_by(id=id).first_or_404()
     
     tracking_info = {
         'product': product.to_dict(),
         'current_location': product.current_location,
         'current_owner': product.current_owner.full_name,
         'status': product.status,
-        'last_update': latest_transaction.timestamp.isoformat() if latest_transaction else None,
+        'last_update': last_update.isoformat() if last_update else None,
         'environmental_conditions': {
             'temperature': product.temperature,
             'humidity': product.humidity,
@@ -432,7 +591,8 @@ def api_track_product(id):
         }
     }
     
-    return jsonify(tracking_info)
+    # orjson when installed (the product dict is already plain values)
+    return json_response(tracking_info)
 
 @products_bp.route('/<int:id>/qr')
 @login_required
@@ -440,11 +600,26 @@ def generate_qr_code(id):
     """
     Generate QR code for product tracking
     """
-    product = Product.query.get_or_404(id)
+    # The page only shows the product's name and batch ID
+    product = Product.query.options(
+        load_only(Product.id, Product.name, Product.batch_id),
+        lazyload(Product.transactions)
+    ).filter_by(id=id).first_or_404()
     
     # QR code would contain URL to track the product
     tracking_url = url_for('products.api_track_product', id=product.id, _external=True)
     
     return render_template('products/qr_code.html', 
                          product=product, 
-                         tracking_url=tracking_url)
\ No newline at end of file
+                         tracking_url=tracking_url)
+
+# Change marks for the product APIs' ETags, built once so the compiled
+# statements are reused
+_SELECT_PRODUCT_VERSION_BY_BATCH = select(Product.id, Product.updated_at)\
+    .where(Product.batch_id == bindparam('batch_id'))
+_SELECT_PRODUCT_TRACK_VERSION = select(
+    Product.updated_at,
+    select(func.max(Transaction.timestamp))
+    .where(Transaction.product_id == Product.id)
+    .scalar_subquery()
+).where(Product.id == bindparam('product_id'))
@@ -342,17 +342,14 @@ function startAutoRefresh() {
 
 // Refresh dashboard data
 function refreshDashboardData() {
-    // Update statistics
-    fetch('/dashboard/api/quick_stats')
+    // Statistics and recent activities come back in one request
+    fetch('/dashboard/api/dashboard')
         .then(response => response.json())
-        .then(data => updateDashboardStats(data))
+        .then(data => {
+            updateDashboardStats(data.stats);
+            updateRecentActivities(data.activities);
+        })
         .catch(error => console.error('Error refreshing dashboard:', error));
-    
-    // Update recent activities
-    fetch('/dashboard/api/recent_activities')
-        .then(response => response.json())
-        .then(data => updateRecentActivities(data))
-        .catch(error => console.error('Error refreshing activities:', error));
 }
 
 // Update dashboard statistics
@@ -731,7 +728,7 @@ function updateRecentActivities(data) {
                     <i class="fas fa-${activity.icon || 'circle'} text-${activity.type || 'primary'}"></i>
                 </div>
                 <div class="timeline-content ms-3">
-                    <h6 class="mb-1">${activity.description}</h6>
+                    <h6 class="mb-1">${describeActivity(activity)}</h6>
                     <small class="text-muted">
                         <i class="fas fa-clock me-1"></i>
                         ${activity.timestamp}
@@ -745,6 +742,26 @@ function updateRecentActivities(data) {
     activitiesContainer.innerHTML = html;
 }
 
+// Escape text before putting it into HTML
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
+
+// Build the text for a recent activity (escaped, names come from user input)
+function describeActivity(activity) {
+    const product = escapeHtml(activity.product_name || 'Unknown product');
+    const counterparty = escapeHtml(activity.counterparty_name || 'Unknown');
+    if (activity.type === 'sent') {
+        return `Sent ${product} to ${counterparty}`;
+    }
+    if (activity.type === 'received') {
+        return `Received ${product} from ${counterparty}`;
+    }
+    return `Created ${product}`;
+}
+
 // Batch ID copy functionality
 function copyBatchId(batchId) {
     copyToClipboard(batchId);